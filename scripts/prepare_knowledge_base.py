@@ -3,12 +3,50 @@ Knowledge Base Preparation Script
 Converts raw text documents into structured JSON for embedding
 """
 
+import hashlib
+import heapq
 import json
+import math
+import os
 import re
+import unicodedata
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Dict
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
 from loguru import logger
 
+try:
+    import orjson
+except ImportError:  # Optional: fall back to stdlib json
+    orjson = None
+
+
+# Runs of whitespace and special chars (anything but word chars, which keep
+# Indonesian diacritics, and basic punctuation) collapse into one space
+_CLEAN_RE = re.compile(r'[^\w\.\,\!\?\-\—\:\;\'\"]+')
+_WORD_RE = re.compile(r'\b\w+\b')
+# Sentence boundary: lookbehind for .!? followed by whitespace
+_SENT_SPLIT_RE = re.compile(r'(?<=[.!?])\s+')
+# Numbering prefix of source file names (e.g. "01_")
+_NUM_PREFIX_RE = re.compile(r'^\d+_')
+
+# Smart quotes -> standard quotes
+_QUOTE_TRANS = str.maketrans({'“': '"', '”': '"', '‘': "'", '’': "'"})
+
+# Stopwords (simplified, includes ID + EN)
+_STOPWORDS = frozenset({
+    'yang', 'dan', 'di', 'ke', 'dari', 'untuk', 'pada', 'dengan',
+    'adalah', 'ini', 'itu', 'atau', 'oleh', 'dalam', 'akan', 'telah',
+    'dapat', 'ada', 'sebagai', 'juga', 'tidak', 'mereka', 'kami',
+    'the', 'a', 'an', 'in', 'on', 'at', 'to', 'for', 'of', 'and',
+    'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has',
+    'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should'
+})
+
 
 class KnowledgeBasePreprocessor:
     """
@@ -17,7 +55,7 @@ class KnowledgeBasePreprocessor:
     Features:
     - Text cleaning and normalization
     - Smart text chunking (splits long docs)
-    - Keyword extraction
+    - Keyword extraction (corpus-level TF-IDF)
     - Bilingual support (ID + EN)
     - Metadata enrichment
     """
@@ -27,6 +65,10 @@ class KnowledgeBasePreprocessor:
         self.output_file = Path(output_file)
         self.documents = []
         
+        # Corpus IDF table, filled in by assign_keywords
+        self.idf: Dict[str, float] = {}
+        self.unseen_idf = 1.0
+        
         # Category definitions
         self.categories = {
             'sejarah': 'History',
@@ -43,24 +85,20 @@ class KnowledgeBasePreprocessor:
         """
         Clean and normalize text
         
+        - Unicode NFKC normalization
         - Remove extra whitespace
         - Normalize punctuation
         - Remove special characters (keep diacritics)
         """
-        # Remove multiple spaces/newlines
-        text = re.sub(r'\s+', ' ', text)
-        
-        # Remove special chars but keep Indonesian diacritics and punctuation
-        text = re.sub(r'[^\w\s\.\,\!\?\-\—\:\;\'\"]', '', text, flags=re.UNICODE)
-        
-        # --- FIX: Normalize quotes (smart quotes -> standard) ---
-        text = text.replace("“", '"').replace("”", '"')
-        text = text.replace("‘", "'").replace("’", "'")
-        
-        # Strip leading/trailing whitespace
-        text = text.strip()
-        
-        return text
+        # Canonicalize ligatures, fullwidth forms and combining diacritics;
+        # pure-ASCII text is already in NFKC so skip the pass
+        if not text.isascii():
+            text = unicodedata.normalize('NFKC', text)
+            # NFKC leaves smart quotes alone, so map them to standard quotes
+            text = text.translate(_QUOTE_TRANS)
+        
+        # Clean whitespace and special chars in one regex pass
+        return _CLEAN_RE.sub(' ', text).strip()
     
     def chunk_text(self, text: str, max_chunk_size: int = 600, overlap: int = 50, min_chunk_size: int = 100) -> List[str]:
         """
@@ -75,106 +113,132 @@ class KnowledgeBasePreprocessor:
         Returns:
             List of text chunks
         """
-        # Split into sentences. (Regex: lookbehind for .!? followed by whitespace)
-        sentences = re.split(r'(?<=[.!?])\s+', text)
+        return list(self.iter_chunks(text, max_chunk_size, overlap, min_chunk_size))
+    
+    def iter_chunks(self, text: str, max_chunk_size: int = 600, overlap: int = 50, min_chunk_size: int = 100) -> Iterator[str]:
+        """
+        Lazily yield the chunks of chunk_text, one at a time
+        
+        Each chunk is held back until the next one is produced, so a short
+        final chunk can still be merged into its predecessor.
+        """
+        # Split into sentences
+        sentences = _SENT_SPLIT_RE.split(text)
         
-        chunks = []
-        current_chunk = ""
+        # Last completed chunk, not yet yielded
+        pending: Optional[str] = None
+        # Accumulate sentences as parts and join only when flushing
+        current_parts: List[str] = []
+        current_len = 0
+        # Last ~10 words of the current chunk for overlap (overlap=50 // 5)
+        words_tail = deque(maxlen=overlap // 5)
         
         for sentence in sentences:
-            sentence_to_add = sentence + ' ' # Re-add space split on
+            sentence_len = len(sentence) + 1 # Re-add space split on
             
             # Handle exceptionally long sentences (longer than max_chunk_size)
-            if len(sentence_to_add) > max_chunk_size:
+            if sentence_len > max_chunk_size:
                 # If there's a chunk being built, save it first
-                if current_chunk.strip():
-                    chunks.append(current_chunk.strip())
+                current_chunk = ' '.join(current_parts).strip()
+                if current_chunk:
+                    if pending:
+                        yield pending
+                    pending = current_chunk
                 
                 # Add the long sentence as its own chunk
                 # (This could be split further, but for now, just add it)
-                chunks.append(sentence_to_add.strip())
-                current_chunk = "" # Reset
+                if pending:
+                    yield pending
+                pending = sentence.strip()
+                current_parts = [] # Reset
+                current_len = 0
+                words_tail.clear()
                 continue # Skip to next sentence
 
             # Standard case: check if adding the sentence exceeds the max
-            if len(current_chunk) + len(sentence_to_add) > max_chunk_size and current_chunk:
+            if current_len + sentence_len > max_chunk_size and current_parts:
                 # Save current chunk
-                chunks.append(current_chunk.strip())
+                if pending:
+                    yield pending
+                pending = ' '.join(current_parts).strip()
                 
-                # Start new chunk with overlap
-                words = current_chunk.split()
-                # Take the last ~10 words for overlap (overlap=50 // 5)
-                overlap_words = words[-overlap//5:] if len(words) > overlap//5 else words
                 # Start new chunk with overlap AND the new sentence
-                current_chunk = ' '.join(overlap_words) + ' ' + sentence_to_add
+                overlap_text = ' '.join(words_tail)
+                current_parts = [overlap_text, sentence]
+                current_len = len(overlap_text) + 1 + sentence_len
             else:
                 # Add sentence to current chunk
-                current_chunk += sentence_to_add
+                current_parts.append(sentence)
+                current_len += sentence_len
+            
+            words_tail.extend(sentence.split())
         
         # --- LOGIC FIX: Handle the last chunk ---
         
         # Add the remaining chunk, check its length
-        final_chunk = current_chunk.strip()
+        final_chunk = ' '.join(current_parts).strip()
         if final_chunk:
             # If the last chunk is too short AND there are preceding chunks
-            if len(final_chunk) < min_chunk_size and len(chunks) > 0:
+            if len(final_chunk) < min_chunk_size and pending is not None:
                 # Merge this short chunk into the previous chunk
                 # This might make the last chunk > max_chunk_size, 
                 # but it's better than a useless tiny chunk.
                 logger.debug(f"Merging short final chunk (len {len(final_chunk)}) to previous chunk.")
-                chunks[-1] = chunks[-1] + ' ' + final_chunk
+                pending = pending + ' ' + final_chunk
             else:
                 # The last chunk is long enough, or this is the *only* chunk
-                chunks.append(final_chunk)
+                if pending:
+                    yield pending
+                pending = final_chunk
         
         # --- END OF LOGIC FIX ---
         
-        # If no chunking was needed (original text was short)
-        if not chunks:
-            chunks = [text]
+        if pending is None:
+            # If no chunking was needed (original text was short)
+            pending = text
         
         # Final filter to ensure no empty strings
-        return [c for c in chunks if c]
+        if pending:
+            yield pending
     
     def extract_keywords(self, text: str, top_n: int = 5) -> List[str]:
         """
-        Extract keywords using frequency analysis
-        (Simple TF approach - for production, use TF-IDF or KeyBERT)
-        """
-        # Stopwords (simplified, includes ID + EN)
-        stopwords = {
-            'yang', 'dan', 'di', 'ke', 'dari', 'untuk', 'pada', 'dengan',
-            'adalah', 'ini', 'itu', 'atau', 'oleh', 'dalam', 'akan', 'telah',
-            'dapat', 'ada', 'sebagai', 'juga', 'tidak', 'mereka', 'kami',
-            'the', 'a', 'an', 'in', 'on', 'at', 'to', 'for', 'of', 'and',
-            'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has',
-            'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should'
-        }
-        
-        # Extract words (lowercase, min length 3)
-        words = re.findall(r'\b\w+\b', text.lower())
-        words = [w for w in words if w not in stopwords and len(w) > 3]
+        Extract keywords from a single text
         
-        # Count frequency
-        word_freq = {}
-        for word in words:
-            word_freq[word] = word_freq.get(word, 0) + 1
+        Uses TF-IDF against the cached corpus IDF once assign_keywords has
+        run, plain term frequency before that.
+        """
+        # Extract words (lowercase, min length 4) and count frequency
+        words = _WORD_RE.findall(text.lower())
+        word_freq = Counter(w for w in words if len(w) > 3 and w not in _STOPWORDS)
+        
+        if not self.idf:
+            # Get top N most frequent
+            return [word for word, freq in word_freq.most_common(top_n)]
+        
+        # Get top N by sublinear TF-IDF, as assign_keywords (words unseen in
+        # the corpus get the highest IDF)
+        idf, unseen_idf = self.idf, self.unseen_idf
+        return heapq.nlargest(
+            top_n, word_freq,
+            key=lambda w: (1 + math.log(word_freq[w])) * idf.get(w, unseen_idf)
+        )
+    
+    def process_txt_file(self, file_path: Path, category: str, language: str) -> List[Dict]:
+        """
+        Process a single text file
         
-        # Get top N most frequent
-        sorted_words = sorted(word_freq.items(), key=lambda x: x[1], reverse=True)
-        keywords = [word for word, freq in sorted_words[:top_n]]
+        Returns the document entries for the file. Document IDs are left
+        unset and assigned by process_directory once all files are done.
+        """
+        documents = []
         
-        return keywords
-    
-    def process_txt_file(self, file_path: Path, category: str, language: str):
-        """Process a single text file"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            content = file_path.read_text(encoding='utf-8')
             
             if not content.strip():
                 logger.warning(f"Empty file: {file_path}")
-                return
+                return documents
             
             # Clean content
             content = self.clean_text(content)
@@ -182,18 +246,17 @@ class KnowledgeBasePreprocessor:
             # If content after cleaning is still < 100, that's an issue
             # But we assume original files > 100, so after cleaning > 100
             
-            # Chunk if necessary
-            # The new chunk_text function will use min_chunk_size=100 by default
-            chunks = self.chunk_text(content, max_chunk_size=600, overlap=50)
-            
             # Extract title from filename
             title = file_path.stem
             # Remove numbering prefix (e.g., "01_" from "01_asal_usul_reog")
-            title = re.sub(r'^\d+_', '', title)
+            title = _NUM_PREFIX_RE.sub('', title)
             title = title.replace('_', ' ').title()
             
-            # Create document entry for each chunk
-            for i, chunk in enumerate(chunks):
+            # Chunk lazily and create a document entry as each chunk arrives
+            # (iter_chunks uses min_chunk_size=100 by default)
+            total_chunks = 0
+            for i, chunk in enumerate(self.iter_chunks(content, max_chunk_size=600, overlap=50)):
+                total_chunks = i + 1
                 
                 # --- Additional validation here ---
                 if len(chunk) < 100:
@@ -201,37 +264,46 @@ class KnowledgeBasePreprocessor:
                     logger.warning(f"Generated chunk is too short ({len(chunk)} chars) from {file_path.name} - Chunk {i}")
                     # Skip this chunk so it doesn't enter the knowledge base
                     continue 
-
-                doc_id = f"doc_{len(self.documents) + 1:04d}"
-                
-                # Extract keywords
-                keywords = self.extract_keywords(chunk)
                 
                 document = {
-                    "id": doc_id,
+                    "id": None,
                     "category": category,
-                    "title": f"{title} - Part {i+1}" if len(chunks) > 1 else title,
+                    "title": f"{title} - Part {i+1}",  # Fixed up below for single-chunk files
                     "language": language,
                     "content": chunk,
-                    "keywords": keywords,
+                    "keywords": [],  # Filled in by assign_keywords
                     "metadata": {
                         "source_file": file_path.name,
                         "chunk_index": i,
-                        "total_chunks": len(chunks),
+                        "total_chunks": None,  # Backfilled once all chunks are known
                         "word_count": len(chunk.split()),
                         "char_count": len(chunk)
                     }
                 }
                 
-                self.documents.append(document)
+                documents.append(document)
+            
+            # Backfill the chunk count now that the generator is exhausted
+            for document in documents:
+                document["metadata"]["total_chunks"] = total_chunks
+                if total_chunks == 1:
+                    document["title"] = title
                 
-            logger.info(f"✅ Processed: {file_path.name} ({len(chunks)} chunks)")
+            logger.info(f"✅ Processed: {file_path.name} ({total_chunks} chunks)")
             
         except Exception as e:
             logger.error(f"❌ Error processing {file_path}: {e}")
+        
+        return documents
     
-    def process_directory(self):
-        """Process all files in raw_data_dir"""
+    def process_directory(self, workers: Optional[int] = None):
+        """
+        Process all files in raw_data_dir
+        
+        Args:
+            workers: Number of worker processes (default: CPU count,
+                     1 to process files in the current process)
+        """
         logger.info("="*70)
         logger.info("KNOWLEDGE BASE PREPROCESSING")
         logger.info("="*70)
@@ -241,6 +313,9 @@ class KnowledgeBasePreprocessor:
             logger.info(f"Please create: {self.raw_data_dir}")
             return
         
+        # Collect (path, category, language) tasks in knowledge base order
+        tasks = []
+        
         for category_dir, category_name in self.categories.items():
             category_path = self.raw_data_dir / category_dir
             
@@ -254,22 +329,99 @@ class KnowledgeBasePreprocessor:
             # Process Indonesian files
             id_dir = category_path / 'id'
             if id_dir.exists():
-                txt_files = sorted(id_dir.glob('*.txt'))
+                txt_files = _list_txt_files(id_dir)
                 logger.info(f"Indonesian files: {len(txt_files)}")
-                for txt_file in txt_files:
-                    self.process_txt_file(txt_file, category_dir, 'id')
+                tasks.extend((txt_file, category_dir, 'id') for txt_file in txt_files)
             else:
                 logger.warning(f"Indonesian directory not found: {id_dir}")
             
             # Process English files
             en_dir = category_path / 'en'
             if en_dir.exists():
-                txt_files = sorted(en_dir.glob('*.txt'))
+                txt_files = _list_txt_files(en_dir)
                 logger.info(f"English files: {len(txt_files)}")
-                for txt_file in txt_files:
-                    self.process_txt_file(txt_file, category_dir, 'en')
+                tasks.extend((txt_file, category_dir, 'en') for txt_file in txt_files)
             else:
                 logger.warning(f"English directory not found: {en_dir}")
+        
+        workers = min(workers or os.cpu_count() or 1, len(tasks))
+        
+        if workers > 1:
+            # Files are independent, so spread them across processes.
+            # map keeps results in task order so document IDs stay stable.
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for file_docs in executor.map(_process_file, tasks, chunksize=8):
+                    self.documents.extend(file_docs)
+        else:
+            for task in tasks:
+                self.documents.extend(self.process_txt_file(*task))
+        
+        self.deduplicate()
+        
+        # Assign sequential document IDs
+        for i, doc in enumerate(self.documents, 1):
+            doc['id'] = f"doc_{i:04d}"
+        
+        self.assign_keywords()
+    
+    def deduplicate(self):
+        """
+        Drop chunks whose content duplicates an earlier chunk
+        
+        Content is compared after lowercasing and ignoring punctuation and
+        whitespace, so boilerplate repeated across files is embedded once.
+        """
+        seen = {}
+        unique_documents = []
+        
+        for doc in self.documents:
+            normalized = ' '.join(_WORD_RE.findall(doc['content'].lower()))
+            key = hashlib.blake2b(normalized.encode('utf-8'), digest_size=16).digest()
+            
+            if key in seen:
+                logger.warning(f"Duplicate chunk dropped: {doc['metadata']['source_file']} "
+                               f"- Chunk {doc['metadata']['chunk_index']} (same as {seen[key]})")
+                continue
+            
+            seen[key] = doc['metadata']['source_file']
+            unique_documents.append(doc)
+        
+        self.documents = unique_documents
+    
+    def assign_keywords(self, top_n: int = 5):
+        """
+        Extract keywords for all documents with TF-IDF
+        
+        The whole corpus is vectorized in one sparse matrix, so words that
+        are common across documents rank below document-specific ones.
+        """
+        if not self.documents:
+            return
+        
+        vectorizer = TfidfVectorizer(
+            stop_words=list(_STOPWORDS),
+            token_pattern=r'(?u)\b\w{4,}\b',  # Same as extract_keywords: min length 4
+            sublinear_tf=True  # 1 + log(tf) so one repeated word doesn't dominate
+        )
+        tfidf = vectorizer.fit_transform(doc['content'] for doc in self.documents)
+        vocab = vectorizer.get_feature_names_out()
+        
+        # Cache the corpus IDF for extract_keywords (smoothed, as sklearn)
+        self.idf = dict(zip(vocab.tolist(), vectorizer.idf_.tolist()))
+        self.unseen_idf = math.log(1 + len(self.documents)) + 1
+        
+        # Top N per row, read straight from the CSR arrays
+        for doc, start, end in zip(self.documents, tfidf.indptr[:-1], tfidf.indptr[1:]):
+            scores = tfidf.data[start:end]
+            terms = tfidf.indices[start:end]
+            
+            if len(scores) > top_n:
+                top = np.argpartition(-scores, top_n)[:top_n]
+            else:
+                top = np.arange(len(scores))
+            top = top[np.argsort(-scores[top], kind='stable')]
+            
+            doc['keywords'] = vocab[terms[top]].tolist()
     
     def save_knowledge_base(self):
         """Save processed documents to JSON"""
@@ -278,35 +430,32 @@ class KnowledgeBasePreprocessor:
             return
         
         # Calculate statistics
-        categories_count = {}
-        languages_count = {}
-        
-        for doc in self.documents:
-            cat = doc['category']
-            lang = doc['language']
-            categories_count[cat] = categories_count.get(cat, 0) + 1
-            languages_count[lang] = languages_count.get(lang, 0) + 1
-        
-        # Prepare output data
-        output_data = {
-            "metadata": {
-                "total_documents": len(self.documents),
-                "categories": list(categories_count.keys()),
-                "languages": list(languages_count.keys()),
-                "statistics": {
-                    "by_category": categories_count,
-                    "by_language": languages_count
-                }
-            },
-            "documents": self.documents
+        categories_count = Counter(doc['category'] for doc in self.documents)
+        languages_count = Counter(doc['language'] for doc in self.documents)
+        
+        metadata = {
+            "total_documents": len(self.documents),
+            "categories": list(categories_count.keys()),
+            "languages": list(languages_count.keys()),
+            "statistics": {
+                "by_category": dict(categories_count),
+                "by_language": dict(languages_count)
+            }
         }
         
         # Create output directory
         self.output_file.parent.mkdir(parents=True, exist_ok=True)
         
-        # Save to JSON
-        with open(self.output_file, 'w', encoding='utf-8') as f:
-            json.dump(output_data, f, ensure_ascii=False, indent=2)
+        # Stream to JSON: metadata first, then one document per line, so only
+        # one serialized document is held in memory at a time
+        with open(self.output_file, 'wb') as f:
+            f.write(b'{\n"metadata": ')
+            f.write(_dumps(metadata))
+            f.write(b',\n"documents": [')
+            for i, doc in enumerate(self.documents):
+                f.write(b',\n' if i else b'\n')
+                f.write(_dumps(doc))
+            f.write(b'\n]\n}\n')
         
         logger.info("\n" + "="*70)
         logger.info("PREPROCESSING COMPLETE!")
@@ -333,17 +482,25 @@ class KnowledgeBasePreprocessor:
         if len(self.documents) < 30:
             issues.append(f"⚠️ Only {len(self.documents)} documents (recommended: 50+)")
         
-        # Check bilingual coverage
-        id_docs = sum(1 for d in self.documents if d['language'] == 'id')
-        en_docs = sum(1 for d in self.documents if d['language'] == 'en')
+        # Gather bilingual coverage and content quality in a single pass
+        id_docs = en_docs = 0
+        short_docs = []
+        for d in self.documents:
+            lang = d['language']
+            if lang == 'id':
+                id_docs += 1
+            elif lang == 'en':
+                en_docs += 1
+            if len(d['content']) < 100:
+                short_docs.append(d)
         
+        # Check bilingual coverage
         if id_docs < 20:
             issues.append(f"⚠️ Only {id_docs} Indonesian documents")
         if en_docs < 20:
             issues.append(f"⚠️ Only {en_docs} English documents")
         
         # Check content quality
-        short_docs = [d for d in self.documents if len(d['content']) < 100]
         if short_docs:
             issues.append(f"⚠️ {len(short_docs)} documents too short (< 100 chars)")
             # Show details for debugging
@@ -361,6 +518,32 @@ class KnowledgeBasePreprocessor:
         return len(issues) == 0
 
 
+def _dumps(obj) -> bytes:
+    """Serialize to compact UTF-8 JSON (orjson when available)"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+
+def _list_txt_files(directory: Path) -> List[Path]:
+    """Sorted .txt files in a directory (one scandir, no extra stat calls)"""
+    with os.scandir(directory) as entries:
+        return sorted(
+            Path(entry.path) for entry in entries
+            if entry.name.endswith('.txt') and entry.is_file()
+        )
+
+
+def _process_file(task) -> List[Dict]:
+    """Worker: process one (path, category, language) task"""
+    file_path, category, language = task
+    return _worker_preprocessor.process_txt_file(file_path, category, language)
+
+
+# Preprocessing methods are stateless, so workers share a bare instance
+_worker_preprocessor = KnowledgeBasePreprocessor(raw_data_dir="", output_file="")
+
+
 # Main execution
 if __name__ == "__main__":
     processor = KnowledgeBasePreprocessor(
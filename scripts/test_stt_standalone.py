@@ -14,6 +14,16 @@ from src.stt_service import STTService
 from loguru import logger
 
 
+AUDIO_SUFFIXES = frozenset({'.wav', '.mp3', '.flac', '.m4a'})
+
+
+def list_audio_files(directory: Path) -> list:
+    """List audio files in a directory with a single directory scan"""
+    if not directory.is_dir():
+        return []
+    return sorted(p for p in directory.iterdir() if p.suffix.lower() in AUDIO_SUFFIXES)
+
+
 def test_stt_with_real_audio():
     """
     Test STT with real audio files
@@ -62,8 +72,7 @@ def test_stt_with_real_audio():
     logger.info("\n2️⃣ TESTING BAHASA INDONESIA AUDIO")
     logger.info("-"*70)
     
-    id_audio_files = list((test_audio_dir / "bahasa_indonesia").glob("*.wav"))
-    id_audio_files.extend(list((test_audio_dir / "bahasa_indonesia").glob("*.mp3")))
+    id_audio_files = list_audio_files(test_audio_dir / "bahasa_indonesia")
     
     if not id_audio_files:
         logger.warning("No Bahasa Indonesia audio files found")
@@ -87,8 +96,7 @@ def test_stt_with_real_audio():
     logger.info("\n3️⃣ TESTING ENGLISH AUDIO")
     logger.info("-"*70)
     
-    en_audio_files = list((test_audio_dir / "english").glob("*.wav"))
-    en_audio_files.extend(list((test_audio_dir / "english").glob("*.mp3")))
+    en_audio_files = list_audio_files(test_audio_dir / "english")
     
     if not en_audio_files:
         logger.warning("No English audio files found")
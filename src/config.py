@@ -6,10 +6,58 @@ import os
 from pathlib import Path
 from dotenv import load_dotenv
 
-load_dotenv()
+# Parse .env once per process tree; child processes inherit the result
+if not os.environ.get("_DOTENV_LOADED"):
+    load_dotenv()
+    os.environ["_DOTENV_LOADED"] = "1"
+
+
+def _env_flag(name: str, default: str = "true") -> bool:
+    return os.getenv(name, default).lower() == "true"
+
+
+def _physical_cores() -> int:
+    """
+    Physical CPU cores this process may use: the affinity set (cpuset)
+    with hyperthread siblings counted once, capped by a cgroup v2 CPU quota
+    """
+    try:
+        cpus = os.sched_getaffinity(0)
+    except AttributeError:  # Not available on macOS/Windows
+        return os.cpu_count() or 1
+    
+    # (package, core) pairs; SMT siblings share one
+    cores = set()
+    for cpu in cpus:
+        topology = Path(f"/sys/devices/system/cpu/cpu{cpu}/topology")
+        try:
+            cores.add((
+                (topology / "physical_package_id").read_text().strip(),
+                (topology / "core_id").read_text().strip()
+            ))
+        except OSError:
+            cores = cpus
+            break
+    count = len(cores) or 1
+    
+    # Container CPU limit, e.g. "200000 100000" = 2 CPUs ("max" = none)
+    try:
+        quota, period = Path("/sys/fs/cgroup/cpu.max").read_text().split()
+        if quota != "max":
+            count = min(count, max(1, int(quota) // int(period)))
+    except (OSError, ValueError):
+        pass
+    
+    return count
+
+
+# Resolved once and shared by the device settings below
+_BASE_DIR = Path(__file__).parent.parent
+_USE_GPU = _env_flag("USE_GPU")
+_CPU_CORES = _physical_cores()
 
 class Config:
-    BASE_DIR = Path(__file__).parent.parent
+    BASE_DIR = _BASE_DIR
     MODELS_DIR = BASE_DIR / "models"
     DATA_DIR = BASE_DIR / "data"
     
@@ -17,13 +65,28 @@ class Config:
     # WHISPER STT CONFIGURATION
     # ========================================================================
     WHISPER_MODEL = os.getenv("WHISPER_MODEL", "small")
-    WHISPER_DEVICE = "cuda" if (
-        os.getenv("USE_GPU", "true").lower() == "true" and 
-        os.getenv("WHISPER_USE_GPU", "true").lower() == "true"
-    ) else "cpu"
+    WHISPER_DEVICE = "cuda" if (_USE_GPU and _env_flag("WHISPER_USE_GPU")) else "cpu"
+    
+    # CTranslate2 compute type (faster-whisper): int8 weights by default,
+    # with FP16 activations on GPU
+    WHISPER_COMPUTE_TYPE = os.getenv(
+        "WHISPER_COMPUTE_TYPE",
+        "int8_float16" if WHISPER_DEVICE == "cuda" else "int8"
+    )
     
     WHISPER_CACHE_DIR = MODELS_DIR / "whisper"
     
+    # CTranslate2 CPU threads (CT2 itself defaults to 4 regardless of cores);
+    # one per usable physical core, hyperthreads don't speed up the GEMMs
+    WHISPER_CPU_THREADS = int(os.getenv("WHISPER_CPU_THREADS", str(_CPU_CORES)))
+    
+    # Concurrent transcribe() calls the shared model runs in parallel
+    # (CTranslate2 workers; on CPU each uses WHISPER_CPU_THREADS threads)
+    WHISPER_NUM_WORKERS = int(os.getenv("WHISPER_NUM_WORKERS", "1"))
+    
+    # Speech chunks decoded per batch by STTService.transcribe_batch
+    WHISPER_BATCH_SIZE = int(os.getenv("WHISPER_BATCH_SIZE", "16"))
+    
     STT_LANGUAGE_HINT = None
     STT_TASK = "transcribe"
     
@@ -31,10 +94,14 @@ class Config:
     # EMBEDDING & VECTOR DB CONFIGURATION
     # ========================================================================
     EMBEDDING_MODEL = "paraphrase-multilingual-MiniLM-L12-v2"
-    EMBEDDING_DEVICE = "cuda" if (
-        os.getenv("USE_GPU", "true").lower() == "true" and
-        os.getenv("EMBEDDING_USE_GPU", "true").lower() == "true"
-    ) else "cpu"
+    # "torch" (SentenceTransformer) or "onnx" (ONNX Runtime, CPU)
+    EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+    EMBEDDING_ONNX_PATH = MODELS_DIR / "embedding_onnx"
+    # INT8 dynamic quantization of the encoder's linear layers (CPU only)
+    EMBEDDING_QUANTIZE = _env_flag("EMBEDDING_QUANTIZE", "false")
+    # ONNX Runtime intra-op threads: one per usable physical core
+    EMBEDDING_CPU_THREADS = int(os.getenv("EMBEDDING_CPU_THREADS", str(_CPU_CORES)))
+    EMBEDDING_DEVICE = "cuda" if (_USE_GPU and _env_flag("EMBEDDING_USE_GPU")) else "cpu"
     
     # ChromaDB
     CHROMA_DB_PATH = DATA_DIR / "embeddings" / "chroma_db"
@@ -45,7 +112,16 @@ class Config:
     
     # RAG Settings
     RAG_TOP_K = 3  # Number of documents to retrieve
-    RAG_SCORE_THRESHOLD = 0.12  # Minimum similarity score
+    RAG_SCORE_THRESHOLD = 0.3  # Minimum cosine similarity
+    # Above this many documents, search pre-filters by binary (sign-bit)
+    # Hamming distance and reranks the candidates with exact cosine
+    BINARY_QUANT_THRESHOLD = int(os.getenv("BINARY_QUANT_THRESHOLD", "100000"))
+    RAG_CACHE_SIZE = 512  # Cached answers (0 disables the cache)
+    RAG_CACHE_TTL = 3600  # seconds
+    # Skip the LLM warmup for a language warmed or used within this window
+    # (below Ollama's default 5-minute keep-alive, so the model is still
+    # loaded)
+    RAG_WARMUP_INTERVAL = 240  # seconds
     
     # ========================================================================
     # LOGGING
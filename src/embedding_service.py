@@ -3,11 +3,17 @@ Embedding Service using Sentence-BERT and ChromaDB
 Handles text embedding and vector database operations
 """
 
+import atexit
 import json
+import threading
+import time
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 
 import chromadb
+import numpy as np
+import torch
 from chromadb.config import Settings
 from sentence_transformers import SentenceTransformer
 from loguru import logger
@@ -15,6 +21,19 @@ from loguru import logger
 from src.config import config
 
 
+# Seconds get_collection_stats results are reused
+STATS_CACHE_TTL = 60
+
+# Upsert batch size when the ChromaDB client doesn't report its limit
+DEFAULT_CHROMA_BATCH_SIZE = 5000
+
+# Batches larger than this are sharded across GPUs when several are present
+MULTI_PROCESS_MIN_TEXTS = 256
+
+# Set bits per byte value, for Hamming distance on packed sign bits
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
 class EmbeddingService:
     """
     Embedding and Vector Database Service
@@ -31,11 +50,48 @@ class EmbeddingService:
         
         # 1. Load Sentence-BERT model
         logger.info(f"   Loading model: {config.EMBEDDING_MODEL}")
-        self.model = SentenceTransformer(
-            config.EMBEDDING_MODEL,
-            device=config.EMBEDDING_DEVICE
-        )
-        logger.info(f"   ✅ Model loaded on {config.EMBEDDING_DEVICE}")
+        if config.EMBEDDING_BACKEND == "onnx":
+            from src.onnx_embedder import ORTEmbedder
+            
+            self.model = ORTEmbedder(
+                config.EMBEDDING_MODEL,
+                config.EMBEDDING_ONNX_PATH,
+                quantize=config.EMBEDDING_QUANTIZE,
+                num_threads=config.EMBEDDING_CPU_THREADS
+            )
+            logger.info("   ✅ Model loaded on ONNX Runtime (cpu)")
+        else:
+            self.model = SentenceTransformer(
+                config.EMBEDDING_MODEL,
+                device=config.EMBEDDING_DEVICE
+            )
+            if str(config.EMBEDDING_DEVICE).startswith("cuda"):
+                # FP16 weights/activations on GPU (tensor cores, half the
+                # memory traffic); vectors leave encode() as Python floats
+                self.model = self.model.half()
+            elif config.EMBEDDING_QUANTIZE and config.EMBEDDING_DEVICE == "cpu":
+                # INT8 weights for all nn.Linear layers (pooling stays FP32)
+                self.model = torch.ao.quantization.quantize_dynamic(
+                    self.model, {torch.nn.Linear}, dtype=torch.qint8
+                )
+            logger.info(f"   ✅ Model loaded on {config.EMBEDDING_DEVICE}")
+        
+        # Multi-GPU encode pool, started on the first large batch
+        self._pool = None
+        
+        # Serializes load_knowledge_base (several RAGService instances or
+        # threads may ask for it at once)
+        self._load_lock = threading.Lock()
+        
+        # (timestamp, stats) from get_collection_stats
+        self._stats_cache: Optional[Tuple[float, Dict]] = None
+        
+        # Sign-bit shadow index for large collections (see _binary_query)
+        self._binary_index: Optional[Dict] = None
+        
+        # Query embeddings for repeated questions (keyed on whitespace-
+        # normalized text)
+        self._embed_query = lru_cache(maxsize=1024)(self._encode_query)
         
         # 2. Initialize ChromaDB
         logger.info(f"   Initializing ChromaDB: {config.CHROMA_DB_PATH}")
@@ -52,17 +108,30 @@ class EmbeddingService:
             )
             logger.info(f"   ✅ Loaded existing collection: {config.CHROMA_COLLECTION_NAME}")
         except:
-            self.collection = self.chroma_client.create_collection(
-                name=config.CHROMA_COLLECTION_NAME,
-                metadata={
-                    "description": "Reog Ponorogo knowledge base",
-                    "embedding_model": config.EMBEDDING_MODEL
-                }
-            )
+            self.collection = self._create_collection()
             logger.info(f"   ✅ Created new collection: {config.CHROMA_COLLECTION_NAME}")
         
+        # Collections from before the switch to cosine distance (L2) are
+        # rebuilt; load_knowledge_base refills the empty collection
+        space = (self.collection.metadata or {}).get("hnsw:space", "l2")
+        if space != "cosine":
+            logger.warning(f"   ⚠️ Collection uses '{space}' distance, recreating with cosine")
+            self.chroma_client.delete_collection(config.CHROMA_COLLECTION_NAME)
+            self.collection = self._create_collection()
+        
         logger.info("✅ Embedding Service ready!")
     
+    def _create_collection(self):
+        """Create the knowledge base collection (cosine HNSW index)"""
+        return self.chroma_client.create_collection(
+            name=config.CHROMA_COLLECTION_NAME,
+            metadata={
+                "description": "Reog Ponorogo knowledge base",
+                "embedding_model": config.EMBEDDING_MODEL,
+                "hnsw:space": "cosine"
+            }
+        )
+    
     def embed_text(self, text: str) -> List[float]:
         """
         Generate embedding for a single text
@@ -71,29 +140,57 @@ class EmbeddingService:
             text: Input text
         
         Returns:
-            384-dimensional embedding vector
+            384-dimensional embedding vector (unit length)
         """
-        embedding = self.model.encode(text, convert_to_numpy=True)
+        embedding = self.model.encode(text, convert_to_numpy=True, normalize_embeddings=True)
         return embedding.tolist()
     
-    def embed_batch(self, texts: List[str], show_progress: bool = True) -> List[List[float]]:
+    def embed_batch(self, texts: List[str], show_progress: bool = True, batch_size: int = 64) -> List[List[float]]:
         """
         Generate embeddings for multiple texts (more efficient)
         
+        Texts are encoded in length-sorted mini-batches to minimize padding
+        and returned in input order.
+        
         Args:
             texts: List of texts
             show_progress: Show progress bar
+            batch_size: Texts per forward pass
         
         Returns:
-            List of embedding vectors
+            List of embedding vectors (unit length)
         """
+        if len(texts) > MULTI_PROCESS_MIN_TEXTS and self._use_multi_process():
+            # Shard across all GPUs (one worker process per device)
+            if self._pool is None:
+                self._pool = self.model.start_multi_process_pool()
+                atexit.register(self.model.stop_multi_process_pool, self._pool)
+            
+            embeddings = self.model.encode_multi_process(texts, self._pool, batch_size=batch_size)
+            embeddings = embeddings / np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+            return embeddings.tolist()
+        
         embeddings = self.model.encode(
             texts,
+            batch_size=batch_size,
             convert_to_numpy=True,
+            normalize_embeddings=True,
             show_progress_bar=show_progress
         )
         return embeddings.tolist()
     
+    def _use_multi_process(self) -> bool:
+        """Multi-process encoding only pays off with several GPUs"""
+        return (
+            isinstance(self.model, SentenceTransformer)
+            and str(config.EMBEDDING_DEVICE).startswith("cuda")
+            and torch.cuda.device_count() > 1
+        )
+    
+    def _encode_query(self, query: str) -> Tuple[float, ...]:
+        """Embed a normalized query (cached by _embed_query)"""
+        return tuple(self.model.encode(query, convert_to_numpy=True, normalize_embeddings=True).tolist())
+    
     def load_knowledge_base(self, force_reload: bool = False):
         """
         Load knowledge base from JSON into ChromaDB
@@ -101,6 +198,12 @@ class EmbeddingService:
         Args:
             force_reload: If True, clear existing data and reload
         """
+        # Only one load at a time: a concurrent caller waits and then sees
+        # the filled collection instead of embedding everything again
+        with self._load_lock:
+            self._load_knowledge_base(force_reload)
+    
+    def _load_knowledge_base(self, force_reload: bool):
         # Check if already loaded
         existing_count = self.collection.count()
         
@@ -111,13 +214,8 @@ class EmbeddingService:
         if force_reload and existing_count > 0:
             logger.warning("⚠️ Force reload: Deleting existing data...")
             self.chroma_client.delete_collection(config.CHROMA_COLLECTION_NAME)
-            self.collection = self.chroma_client.create_collection(
-                name=config.CHROMA_COLLECTION_NAME,
-                metadata={
-                    "description": "Reog Ponorogo knowledge base",
-                    "embedding_model": config.EMBEDDING_MODEL
-                }
-            )
+            self.collection = self._create_collection()
+            self._binary_index = None
         
         # Load knowledge base JSON
         logger.info(f"📂 Loading knowledge base from: {config.KNOWLEDGE_BASE_FILE}")
@@ -155,28 +253,32 @@ class EmbeddingService:
         # Add to ChromaDB
         logger.info("💾 Adding to vector database...")
         
-        # ChromaDB has a batch size limit, so we chunk the data
-        batch_size = 100
+        # One upsert for the whole knowledge base, split only where it would
+        # exceed ChromaDB's batch size limit; upsert keeps re-runs idempotent
+        batch_size = getattr(self.chroma_client, "max_batch_size", DEFAULT_CHROMA_BATCH_SIZE)
         for i in range(0, len(documents), batch_size):
             end_idx = min(i + batch_size, len(documents))
             
-            self.collection.add(
+            self.collection.upsert(
                 ids=ids[i:end_idx],
                 embeddings=embeddings[i:end_idx],
                 documents=texts[i:end_idx],
                 metadatas=metadatas[i:end_idx]
             )
-            
-            logger.info(f"   Added batch {i//batch_size + 1} ({end_idx}/{len(documents)})")
         
         logger.info(f"✅ Loaded {len(documents)} documents into ChromaDB")
+        self._stats_cache = None
+        
+        if len(documents) > config.BINARY_QUANT_THRESHOLD:
+            self._binary_index = self._build_binary_index(ids, embeddings, metadatas)
     
     def search(
         self,
         query: str,
         top_k: int = None,
         language_filter: Optional[str] = None,
-        category_filter: Optional[str] = None
+        category_filter: Optional[str] = None,
+        query_embedding: Optional[List[float]] = None
     ) -> List[Dict]:
         """
         Semantic search for relevant documents
@@ -186,6 +288,8 @@ class EmbeddingService:
             top_k: Number of results to return
             language_filter: Filter by language ('id' or 'en')
             category_filter: Filter by category
+            query_embedding: Precomputed embedding of the query
+                             (e.g. from embed_batch) to search with
         
         Returns:
             List of documents with scores
@@ -200,41 +304,126 @@ class EmbeddingService:
         if category_filter:
             where_filter['category'] = category_filter
         
-        # Query ChromaDB
-        results = self.collection.query(
-            query_texts=[query],
-            n_results=top_k,
-            where=where_filter if where_filter else None
-        )
+        # Embed the query with our own model (cached for repeated queries)
+        # rather than leaving it to Chroma's default embedding function
+        if query_embedding is None:
+            query_embedding = list(self._embed_query(' '.join(query.split())))
+        
+        # Query ChromaDB (large collections: binary pre-filter + rerank)
+        if self.collection.count() > config.BINARY_QUANT_THRESHOLD:
+            results = self._binary_query(query_embedding, top_k, where_filter)
+        else:
+            results = self.collection.query(
+                query_embeddings=[query_embedding],
+                n_results=top_k,
+                where=where_filter if where_filter else None
+            )
         
-        # Format results
-        documents = []
-        
-        if results['ids'] and len(results['ids'][0]) > 0:
-            for i in range(len(results['ids'][0])):
-                # Convert distance to similarity score (1 - distance)
-                # ChromaDB uses L2 distance by default
-                distance = results['distances'][0][i]
-                similarity = 1 / (1 + distance)  # Convert to 0-1 range
-                
-                doc = {
-                    'id': results['ids'][0][i],
-                    'content': results['documents'][0][i],
-                    'score': similarity,
-                    'distance': distance,
-                    'metadata': results['metadatas'][0][i]
-                }
-                
-                # Filter by score threshold
-                if doc['score'] >= config.RAG_SCORE_THRESHOLD:
-                    documents.append(doc)
+        # Format results in one pass over Chroma's parallel columns,
+        # dropping hits below the score threshold (cosine distance, so
+        # similarity = 1 - distance)
+        threshold = config.RAG_SCORE_THRESHOLD
+        documents = [
+            {
+                'id': doc_id,
+                'content': content,
+                'score': 1.0 - distance,
+                'distance': distance,
+                'metadata': metadata
+            }
+            for doc_id, content, distance, metadata in zip(
+                results['ids'][0],
+                results['documents'][0],
+                results['distances'][0],
+                results['metadatas'][0]
+            ) if 1.0 - distance >= threshold
+        ] if results['ids'] else []
         
         logger.info(f"🔍 Search: '{query[:50]}...' → {len(documents)} results")
         
         return documents
     
+    def _build_binary_index(self, ids: List[str], embeddings, metadatas: List[Dict]) -> Dict:
+        """Pack embedding sign bits (384 dims -> 48 bytes) for Hamming search"""
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        logger.info(f"🧮 Building binary index ({len(ids)} documents)")
+        return {
+            'ids': np.asarray(ids, dtype=object),
+            'bits': np.packbits(vectors > 0, axis=1),
+            'language': np.asarray([m.get('language', '') for m in metadatas], dtype=object),
+            'category': np.asarray([m.get('category', '') for m in metadatas], dtype=object)
+        }
+    
+    def _binary_query(self, query_embedding: List[float], top_k: int, where_filter: Dict) -> Dict:
+        """
+        Approximate search for large collections
+        
+        Takes the top_k * 10 candidates by Hamming distance on sign bits,
+        then reranks them by exact cosine on the stored FP32 vectors.
+        Returns results shaped like collection.query().
+        """
+        if self._binary_index is None:
+            stored = self.collection.get(include=["embeddings", "metadatas"])
+            self._binary_index = self._build_binary_index(
+                stored['ids'], stored['embeddings'], stored['metadatas']
+            )
+        index = self._binary_index
+        
+        # Apply metadata filters before ranking
+        candidates = np.arange(len(index['ids']))
+        for key, value in where_filter.items():
+            candidates = candidates[index[key][candidates] == value]
+        
+        # Nothing passes the filter: collection.get(ids=[]) would return the
+        # whole collection, ignoring the filter
+        if len(candidates) == 0:
+            return {'ids': [[]], 'documents': [[]], 'metadatas': [[]], 'distances': [[]]}
+        
+        # Hamming top-N candidates
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query_bits = np.packbits(query > 0)
+        hamming = _POPCOUNT[np.bitwise_xor(index['bits'][candidates], query_bits)].sum(axis=1, dtype=np.int32)
+        n_candidates = min(top_k * 10, len(candidates))
+        if n_candidates < len(candidates):
+            candidates = candidates[np.argpartition(hamming, n_candidates - 1)[:n_candidates]]
+        
+        # Rerank with FP32 cosine
+        fetched = self.collection.get(
+            ids=index['ids'][candidates].tolist(),
+            include=["embeddings", "documents", "metadatas"]
+        )
+        if not fetched['ids']:
+            return {'ids': [[]], 'documents': [[]], 'metadatas': [[]], 'distances': [[]]}
+        
+        vectors = np.asarray(fetched['embeddings'], dtype=np.float32)
+        similarity = (vectors @ query) / np.clip(
+            np.linalg.norm(vectors, axis=1) * np.linalg.norm(query), 1e-12, None
+        )
+        best = np.argsort(-similarity)[:top_k]
+        
+        return {
+            'ids': [[fetched['ids'][i] for i in best]],
+            'documents': [[fetched['documents'][i] for i in best]],
+            'metadatas': [[fetched['metadatas'][i] for i in best]],
+            'distances': [[float(1.0 - similarity[i]) for i in best]]
+        }
+    
     def get_collection_stats(self) -> Dict:
-        """Get statistics about the collection"""
+        """
+        Get statistics about the collection
+        
+        Cached for STATS_CACHE_TTL seconds (the knowledge base rarely
+        changes; load_knowledge_base invalidates the cache).
+        """
+        now = time.monotonic()
+        if self._stats_cache is not None and now - self._stats_cache[0] < STATS_CACHE_TTL:
+            return self._stats_cache[1]
+        
+        stats = self._compute_collection_stats()
+        self._stats_cache = (now, stats)
+        return stats
+    
+    def _compute_collection_stats(self) -> Dict:
         count = self.collection.count()
         
         if count == 0:
@@ -244,15 +433,14 @@ class EmbeddingService:
                 'languages': []
             }
         
-        # Sample items to get categories/languages
-        sample_size = min(count, 100)
-        sample = self.collection.peek(limit=sample_size)
+        # Categories/languages from all metadata (no documents/embeddings)
+        stored = self.collection.get(include=["metadatas"])
         
         categories = set()
         languages = set()
         
-        if sample['metadatas']:
-            for meta in sample['metadatas']:
+        if stored['metadatas']:
+            for meta in stored['metadatas']:
                 categories.add(meta.get('category', 'unknown'))
                 languages.add(meta.get('language', 'unknown'))
         
@@ -279,13 +467,21 @@ class EmbeddingService:
 
 # Singleton instance
 _embedding_service_instance = None
+_embedding_service_lock = threading.Lock()
 
 def get_embedding_service() -> EmbeddingService:
-    """Get singleton Embedding service instance"""
+    """Get singleton Embedding service instance (thread-safe)"""
     global _embedding_service_instance
     if _embedding_service_instance is None:
-        _embedding_service_instance = EmbeddingService()
+        with _embedding_service_lock:
+            if _embedding_service_instance is None:
+                _embedding_service_instance = EmbeddingService()
     return _embedding_service_instance
 
-# For backward compatibility
-embedding_service = get_embedding_service()
\ No newline at end of file
+
+def __getattr__(name: str):
+    # For backward compatibility: `embedding_service` is created on first access
+    # instead of at import time
+    if name == "embedding_service":
+        return get_embedding_service()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
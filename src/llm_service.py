@@ -3,13 +3,69 @@ LLM Service using Ollama (Llama 3.2)
 Handles answer generation from context and questions
 """
 
+import asyncio
+import io
+import itertools
+import json
+import re
+import threading
+import httpx
 import requests
-from typing import List, Dict, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Dict, Iterator, List, Optional
 from loguru import logger
 
 from src.config import config
 
 
+# System prompts per response language
+SYSTEM_PROMPTS = {
+    'id': """Anda adalah pemandu virtual museum Reog Ponorogo yang ramah dan berpengetahuan luas.
+
+TUGAS ANDA:
+- Menjawab pertanyaan pengunjung tentang Reog Ponorogo
+- Gunakan HANYA informasi dari konteks yang diberikan
+- Berikan jawaban yang informatif namun ringkas (2-4 kalimat)
+- Bersikap ramah dan antusias tentang budaya Reog
+
+ATURAN PENTING:
+1. Jika informasi tidak ada dalam konteks, katakan "Maaf, saya tidak memiliki informasi tentang hal tersebut dalam basis pengetahuan saya."
+2. Jangan mengarang atau menambahkan informasi yang tidak ada di konteks
+3. Gunakan Bahasa Indonesia yang jelas dan mudah dipahami
+4. Fokus pada informasi yang paling relevan dengan pertanyaan
+5. Jangan memulai jawaban dengan sapaan pembuka""",
+    'en': """You are a friendly and knowledgeable Reog Ponorogo virtual museum guide.
+
+YOUR TASK:
+- Answer visitors' questions about Reog Ponorogo
+- Use ONLY information from the provided context
+- Provide informative yet concise answers (2-4 sentences)
+- Be friendly and enthusiastic about Reog culture
+
+IMPORTANT RULES:
+1. If information is not in the context, say "I'm sorry, I don't have information about that in my knowledge base."
+2. Do not make up or add information not present in the context
+3. Use clear and easy-to-understand English
+4. Focus on information most relevant to the question
+5. Don't start your answer with an opening greeting"""
+}
+
+# Prompt repetition the model sometimes echoes at the start of an answer
+_STRIP_PREFIXES = {
+    'id': ('Jawaban:', 'Jawab:', 'Berdasarkan konteks,'),
+    'en': ('Answer:', 'Based on the context,')
+}
+_PREFIX_RES = {
+    language: re.compile('^' + ''.join(rf'(?:{re.escape(prefix)}\s*)?' for prefix in prefixes))
+    for language, prefixes in _STRIP_PREFIXES.items()
+}
+
+
+class LLMStreamError(RuntimeError):
+    """A streamed generation failed or ended before Ollama reported done"""
+
+
 class LLMService:
     """
     Large Language Model Service via Ollama
@@ -18,7 +74,7 @@ class LLMService:
     - Answer generation from context
     - Bilingual support (ID + EN)
     - Prompt engineering for RAG
-    - Streaming support (optional)
+    - Streaming support (token-by-token)
     - Configurable parameters
     """
     
@@ -30,9 +86,28 @@ class LLMService:
         logger.info(f"   Base URL: {self.base_url}")
         logger.info(f"   Model: {self.model}")
         
+        # Persistent session: reuse keep-alive connections to Ollama instead
+        # of opening a new TCP connection per request
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=32,
+            max_retries=Retry(total=2, backoff_factor=0.1)
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Connection": "keep-alive"})
+        
+        # Async clients for agenerate(), one per event loop (see
+        # _get_aclient): one loop can multiplex many in-flight generations
+        # without blocking a thread each. Values are (client, closer): the
+        # closer async generator closes the client when the loop shuts down
+        self._aclients: Dict[asyncio.AbstractEventLoop, tuple] = {}
+        self._aclients_lock = threading.Lock()
+        
         # Test connection
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
+            response = self.session.get(f"{self.base_url}/api/tags", timeout=5)
             
             if response.status_code == 200:
                 models_data = response.json()
@@ -67,38 +142,29 @@ class LLMService:
             system_prompt: System instruction (prepended to prompt)
             temperature: Sampling temperature (0-1, default from config)
             max_tokens: Maximum tokens to generate (default from config)
-            stream: Stream response (not implemented yet)
+            stream: Receive the response token by token (see generate_stream)
+                    and assemble it here
         
         Returns:
             Generated text
         """
+        if stream:
+            try:
+                return "".join(self.generate_stream(prompt, system_prompt, temperature, max_tokens)).strip()
+            except LLMStreamError:
+                return ""
+        
         if temperature is None:
             temperature = config.OLLAMA_TEMPERATURE
         
         if max_tokens is None:
             max_tokens = config.OLLAMA_MAX_TOKENS
         
-        # Build full prompt
-        full_prompt = prompt
-        if system_prompt:
-            full_prompt = f"{system_prompt}\n\n{prompt}"
-        
         try:
             # Call Ollama API
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/api/generate",
-                json={
-                    "model": self.model,
-                    "prompt": full_prompt,
-                    "stream": stream,
-                    "options": {
-                        "temperature": temperature,
-                        "num_predict": max_tokens,
-                        "top_p": 0.9,
-                        "top_k": 40,
-                        "repeat_penalty": 1.1
-                    }
-                },
+                json=self._build_payload(prompt, system_prompt, temperature, max_tokens, stream=False),
                 timeout=60  # 60 seconds timeout
             )
             
@@ -122,6 +188,227 @@ class LLMService:
             logger.error(f"❌ LLM Error: {e}")
             return ""
     
+    async def agenerate(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None
+    ) -> str:
+        """
+        Async variant of generate (non-streaming)
+        
+        Args: same as generate()
+        
+        Returns:
+            Generated text ("" on error)
+        """
+        if temperature is None:
+            temperature = config.OLLAMA_TEMPERATURE
+        
+        if max_tokens is None:
+            max_tokens = config.OLLAMA_MAX_TOKENS
+        
+        try:
+            client = await self._get_aclient()
+            response = await client.post(
+                "/api/generate",
+                json=self._build_payload(prompt, system_prompt, temperature, max_tokens, stream=False)
+            )
+            
+            if response.status_code == 200:
+                generated_text = response.json().get('response', '').strip()
+                
+                logger.info(f"🤖 LLM generated {len(generated_text)} characters")
+                logger.debug(f"   Text: {generated_text[:100]}...")
+                
+                return generated_text
+            else:
+                logger.error(f"❌ LLM generation failed: {response.status_code}")
+                logger.error(f"   Response: {response.text}")
+                return ""
+                
+        except httpx.TimeoutException:
+            logger.error("❌ LLM request timeout (> 60s)")
+            return ""
+        except Exception as e:
+            logger.error(f"❌ LLM Error: {e}")
+            return ""
+    
+    async def _get_aclient(self) -> httpx.AsyncClient:
+        """
+        Async client bound to the running event loop
+        
+        Keep-alive connections belong to the loop that opened them, so each
+        loop (e.g. every asyncio.run()) gets its own client. It is closed
+        while the loop shuts down (asyncio.run() finalizes pending async
+        generators, see _close_with_loop); clients of loops closed without
+        that step are dropped here.
+        """
+        loop = asyncio.get_running_loop()
+        closer = None
+        with self._aclients_lock:
+            stale = [self._aclients.pop(l) for l in list(self._aclients) if l.is_closed()]
+            
+            entry = self._aclients.get(loop)
+            if entry is not None and not entry[0].is_closed:
+                client = entry[0]
+            else:
+                client = httpx.AsyncClient(
+                    base_url=self.base_url,
+                    timeout=60,
+                    limits=httpx.Limits(max_connections=32, max_keepalive_connections=32)
+                )
+                closer = self._close_with_loop(loop, client)
+                self._aclients[loop] = (client, closer)
+        
+        for _, stale_closer in stale:
+            # Their transports belong to a closed loop, so this may fail;
+            # the sockets are then released with the dropped client
+            try:
+                await stale_closer.aclose()
+            except Exception as e:
+                logger.debug(f"Closing stale async client failed: {e}")
+        
+        if closer is not None:
+            # Start the closer so the loop tracks it as a pending async generator
+            await closer.__anext__()
+        return client
+    
+    async def _close_with_loop(self, loop: asyncio.AbstractEventLoop, client: httpx.AsyncClient):
+        """Suspends until the loop finalizes it, then closes and forgets client"""
+        try:
+            yield
+        finally:
+            with self._aclients_lock:
+                if self._aclients.get(loop, (None,))[0] is client:
+                    del self._aclients[loop]
+            await client.aclose()
+    
+    async def aclose(self):
+        """Close the async HTTP client of the running event loop"""
+        loop = asyncio.get_running_loop()
+        with self._aclients_lock:
+            entry = self._aclients.pop(loop, None)
+        if entry is not None:
+            await entry[1].aclose()
+    
+    def generate_stream(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None
+    ) -> Iterator[str]:
+        """
+        Generate text completion, yielding tokens as Ollama produces them
+        
+        Args: same as generate()
+        
+        Yields:
+            Generated text pieces
+        
+        Raises:
+            LLMStreamError: if the request fails or the stream ends before
+                Ollama sends done (pieces already yielded are incomplete)
+        """
+        if temperature is None:
+            temperature = config.OLLAMA_TEMPERATURE
+        
+        if max_tokens is None:
+            max_tokens = config.OLLAMA_MAX_TOKENS
+        
+        try:
+            with self.session.post(
+                f"{self.base_url}/api/generate",
+                json=self._build_payload(prompt, system_prompt, temperature, max_tokens, stream=True),
+                stream=True,
+                timeout=60  # 60 seconds between chunks
+            ) as response:
+                if response.status_code != 200:
+                    logger.error(f"❌ LLM generation failed: {response.status_code}")
+                    logger.error(f"   Response: {response.text}")
+                    raise LLMStreamError(f"Ollama returned {response.status_code}")
+                
+                total_chars = 0
+                # One JSON object per line until "done"
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    piece = chunk.get('response', '')
+                    if piece:
+                        total_chars += len(piece)
+                        yield piece
+                    if chunk.get('done'):
+                        break
+                else:
+                    logger.error(f"❌ LLM stream ended before done ({total_chars} characters)")
+                    raise LLMStreamError("Stream ended before done")
+                
+                logger.info(f"🤖 LLM streamed {total_chars} characters")
+                
+        except LLMStreamError:
+            raise
+        except requests.exceptions.Timeout as e:
+            logger.error("❌ LLM request timeout (> 60s)")
+            raise LLMStreamError("LLM request timeout") from e
+        except Exception as e:
+            logger.error(f"❌ LLM Error: {e}")
+            raise LLMStreamError(str(e)) from e
+    
+    def warmup(self, language: str = 'id') -> bool:
+        """
+        Load the model and prefill the system prompt on the Ollama side
+        
+        Ollama reuses the cached prompt prefix, so a following
+        generate_answer() only has to evaluate the context and question.
+        
+        Returns:
+            True if Ollama answered the warmup request
+        """
+        payload = self._build_payload(
+            prompt="",
+            system_prompt=self._get_system_prompt(language),
+            temperature=0.0,
+            max_tokens=1,
+            stream=False
+        )
+        
+        try:
+            response = self.session.post(f"{self.base_url}/api/generate", json=payload, timeout=60)
+            return response.status_code == 200
+        except requests.exceptions.RequestException as e:
+            logger.debug(f"LLM warmup failed: {e}")
+            return False
+    
+    def _build_payload(
+        self,
+        prompt: str,
+        system_prompt: Optional[str],
+        temperature: float,
+        max_tokens: int,
+        stream: bool
+    ) -> Dict:
+        """Build the Ollama /api/generate request body"""
+        # Build full prompt
+        full_prompt = prompt
+        if system_prompt:
+            full_prompt = f"{system_prompt}\n\n{prompt}"
+        
+        return {
+            "model": self.model,
+            "prompt": full_prompt,
+            "stream": stream,
+            "options": {
+                "temperature": temperature,
+                "num_predict": max_tokens,
+                "top_p": 0.9,
+                "top_k": 40,
+                "repeat_penalty": 1.1
+            }
+        }
+    
     def generate_answer(
         self,
         question: str,
@@ -141,19 +428,12 @@ class LLMService:
         Returns:
             Generated answer
         """
-        # Build context from documents
-        context = self._build_context(context_documents)
-        
-        # Get system prompt
-        system_prompt = self._get_system_prompt(language)
-        
-        # Build user prompt
-        user_prompt = self._build_user_prompt(question, context, language)
+        # Build the full prompt (system + context + question) in one pass
+        prompt = self.build_rag_prompt(question, context_documents, language)
         
         # Generate answer
         answer = self.generate(
-            prompt=user_prompt,
-            system_prompt=system_prompt,
+            prompt=prompt,
             temperature=config.OLLAMA_TEMPERATURE,
             max_tokens=256  # Shorter for concise answers
         )
@@ -163,93 +443,139 @@ class LLMService:
         
         return answer
     
-    def _build_context(self, documents: List[Dict]) -> str:
-        """Build context string from retrieved documents"""
-        context_parts = []
+    async def agenerate_answer(
+        self,
+        question: str,
+        context_documents: List[Dict],
+        language: str = 'id'
+    ) -> str:
+        """Async variant of generate_answer"""
+        prompt = self.build_rag_prompt(question, context_documents, language)
         
-        for i, doc in enumerate(documents, 1):
-            content = doc['content']
-            title = doc['metadata'].get('title', 'Unknown')
-            category = doc['metadata'].get('category', '')
-            
-            context_parts.append(f"[Dokumen {i}: {title} ({category})]\n{content}")
+        answer = await self.agenerate(
+            prompt=prompt,
+            temperature=config.OLLAMA_TEMPERATURE,
+            max_tokens=256  # Shorter for concise answers
+        )
         
-        return "\n\n".join(context_parts)
+        return self._postprocess_answer(answer, language)
     
-    def _get_system_prompt(self, language: str) -> str:
-        """Get system prompt based on language"""
-        if language == 'id':
-            return """Anda adalah pemandu virtual museum Reog Ponorogo yang ramah dan berpengetahuan luas.
-
-TUGAS ANDA:
-- Menjawab pertanyaan pengunjung tentang Reog Ponorogo
-- Gunakan HANYA informasi dari konteks yang diberikan
-- Berikan jawaban yang informatif namun ringkas (2-4 kalimat)
-- Bersikap ramah dan antusias tentang budaya Reog
-
-ATURAN PENTING:
-1. Jika informasi tidak ada dalam konteks, katakan "Maaf, saya tidak memiliki informasi tentang hal tersebut dalam basis pengetahuan saya."
-2. Jangan mengarang atau menambahkan informasi yang tidak ada di konteks
-3. Gunakan Bahasa Indonesia yang jelas dan mudah dipahami
-4. Fokus pada informasi yang paling relevan dengan pertanyaan
-5. Jangan memulai jawaban dengan sapaan pembuka"""
+    def generate_answer_stream(
+        self,
+        question: str,
+        context_documents: List[Dict],
+        language: str = 'id'
+    ) -> Iterator[str]:
+        """
+        Streaming variant of generate_answer
         
-        else:  # English
-            return """You are a friendly and knowledgeable Reog Ponorogo virtual museum guide.
-
-YOUR TASK:
-- Answer visitors' questions about Reog Ponorogo
-- Use ONLY information from the provided context
-- Provide informative yet concise answers (2-4 sentences)
-- Be friendly and enthusiastic about Reog culture
-
-IMPORTANT RULES:
-1. If information is not in the context, say "I'm sorry, I don't have information about that in my knowledge base."
-2. Do not make up or add information not present in the context
-3. Use clear and easy-to-understand English
-4. Focus on information most relevant to the question
-5. Don't start your answer with an opening greeting"""
+        Yields answer pieces as they are generated. The same post-processing
+        is applied on the fly: the opening is buffered until prompt
+        prefixes can be stripped, and final punctuation is added at the end.
+        
+        Raises:
+            LLMStreamError: from generate_stream; no punctuation is added to
+                a cut-off answer
+        """
+        prompt = self.build_rag_prompt(question, context_documents, language)
+        
+        pieces = self.generate_stream(
+            prompt=prompt,
+            temperature=config.OLLAMA_TEMPERATURE,
+            max_tokens=256  # Shorter for concise answers
+        )
+        
+        # Buffer the opening until, with prefixes stripped, it is longer than
+        # any prefix
+        head = ""
+        for piece in pieces:
+            head += piece
+            if len(self._clean_answer_start(head, language)) >= self._PREFIX_WINDOW:
+                break
+        
+        head = self._clean_answer_start(head, language)
+        
+        # Hold back trailing whitespace so the answer ends cleanly (as the
+        # stripped blocking answer does)
+        tail = ""
+        pending_ws = ""
+        for piece in itertools.chain([head], pieces):
+            text = piece.rstrip()
+            if text:
+                yield pending_ws + text
+                tail = text
+                pending_ws = piece[len(text):]
+            else:
+                pending_ws += piece
+        
+        # Ensure ends with punctuation
+        if tail and tail[-1] not in '.!?':
+            yield '.'
     
-    def _build_user_prompt(self, question: str, context: str, language: str) -> str:
-        """Build user prompt with context and question"""
+    def build_rag_prompt(self, question: str, documents: List[Dict], language: str = 'id') -> str:
+        """
+        Build the complete RAG prompt: system prompt, retrieved documents and
+        the visitor question, written once into a single buffer
+        
+        Args:
+            question: User question
+            documents: Retrieved documents from vector search
+            language: Response language ('id' or 'en')
+        
+        Returns:
+            Prompt text to send as-is (no separate system prompt)
+        """
+        buf = io.StringIO()
+        write = buf.write
+        
+        write(self._get_system_prompt(language))
+        write("\n\nKonteks informasi:\n" if language == 'id' else "\n\nContext information:\n")
+        
+        # Context from documents
+        for i, doc in enumerate(documents, 1):
+            metadata = doc['metadata']
+            if i > 1:
+                write("\n\n")
+            write(f"[Dokumen {i}: {metadata.get('title', 'Unknown')} ({metadata.get('category', '')})]\n")
+            write(doc['content'])
+        
         if language == 'id':
-            return f"""Konteks informasi:
-{context}
-
-Pertanyaan pengunjung: {question}
-
-Jawaban (dalam 2-4 kalimat):"""
+            write(f"\n\nPertanyaan pengunjung: {question}\n\nJawaban (dalam 2-4 kalimat):")
         else:
-            return f"""Context information:
-{context}
-
-Visitor question: {question}
-
-Answer (in 2-4 sentences):"""
+            write(f"\n\nVisitor question: {question}\n\nAnswer (in 2-4 sentences):")
+        
+        return buf.getvalue()
+    
+    def _get_system_prompt(self, language: str) -> str:
+        """Get system prompt based on language"""
+        return SYSTEM_PROMPTS['id' if language == 'id' else 'en']
+    
+    # Longer than any prefix stripped by _clean_answer_start
+    _PREFIX_WINDOW = 32
     
     def _postprocess_answer(self, answer: str, language: str) -> str:
         """Post-process generated answer"""
         # Remove common LLM artifacts
-        answer = answer.strip()
+        answer = self._clean_answer_start(answer.strip(), language).rstrip()
         
-        # Remove potential prompt repetition
-        if language == 'id':
-            prefixes_to_remove = ['Jawaban:', 'Jawab:', 'Berdasarkan konteks,']
-        else:
-            prefixes_to_remove = ['Answer:', 'Based on the context,']
+        # Ensure ends with punctuation
+        if answer and answer[-1] not in '.!?':
+            answer += '.'
         
-        for prefix in prefixes_to_remove:
-            if answer.startswith(prefix):
-                answer = answer[len(prefix):].strip()
+        return answer
+    
+    def _clean_answer_start(self, answer: str, language: str) -> str:
+        """Strip prompt repetition from the start of an answer and capitalize"""
+        answer = answer.lstrip()
+        
+        # Remove potential prompt repetition (each prefix at most once, in
+        # order)
+        answer = _PREFIX_RES['id' if language == 'id' else 'en'].sub('', answer, count=1)
         
         # Ensure proper capitalization
         if answer and not answer[0].isupper():
             answer = answer[0].upper() + answer[1:]
         
-        # Ensure ends with punctuation
-        if answer and answer[-1] not in '.!?':
-            answer += '.'
-        
         return answer
     
     def test_generation(self, test_prompt: str = None) -> Dict:
@@ -273,13 +599,21 @@ Answer (in 2-4 sentences):"""
 
 # Singleton instance
 _llm_service_instance = None
+_llm_service_lock = threading.Lock()
 
 def get_llm_service() -> LLMService:
-    """Get singleton LLM service instance"""
+    """Get singleton LLM service instance (thread-safe)"""
     global _llm_service_instance
     if _llm_service_instance is None:
-        _llm_service_instance = LLMService()
+        with _llm_service_lock:
+            if _llm_service_instance is None:
+                _llm_service_instance = LLMService()
     return _llm_service_instance
 
-# For backward compatibility
-llm_service = get_llm_service()
\ No newline at end of file
+
+def __getattr__(name: str):
+    # For backward compatibility: `llm_service` is created on first access
+    # instead of at import time
+    if name == "llm_service":
+        return get_llm_service()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
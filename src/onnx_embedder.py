@@ -0,0 +1,159 @@
+"""
+ONNX Runtime backend for the Sentence-BERT encoder
+Drop-in replacement for SentenceTransformer.encode on CPU
+"""
+
+from pathlib import Path
+from typing import Dict, List, Union
+
+import numpy as np
+from loguru import logger
+
+try:
+    import onnxruntime as ort
+    from transformers import AutoTokenizer
+except ImportError:  # Optional: only needed for EMBEDDING_BACKEND=onnx
+    ort = None
+    AutoTokenizer = None
+
+
+class ORTEmbedder:
+    """
+    Sentence-BERT encoder running on ONNX Runtime
+    
+    Exports the Hugging Face model to ONNX on first use (via optimum) and
+    runs it with all graph optimizations (fused attention/LayerNorm).
+    Output matches SentenceTransformer: mean pooling over the attention
+    mask, L2 normalization only if requested. With quantize=True the
+    MatMul/Gemm weights are dynamically quantized to INT8 (pooling stays
+    FP32).
+    """
+    
+    def __init__(
+        self,
+        model_name: str,
+        onnx_dir: Path,
+        max_seq_length: int = 128,
+        quantize: bool = False,
+        num_threads: int = 0
+    ):
+        if ort is None:
+            raise ImportError(
+                "EMBEDDING_BACKEND=onnx requires onnxruntime and optimum: "
+                "pip install optimum[onnxruntime]"
+            )
+        
+        self.onnx_dir = Path(onnx_dir)
+        # Same truncation as the SentenceTransformer model config
+        self.max_seq_length = max_seq_length
+        model_file = self.onnx_dir / "model.onnx"
+        
+        if not model_file.exists():
+            self._export(model_name)
+        
+        if quantize:
+            model_file = self._quantize(model_file)
+        
+        # Session with full graph optimization; num_threads=0 leaves the
+        # intra-op thread count to ONNX Runtime (one per physical core)
+        so = ort.SessionOptions()
+        so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        so.intra_op_num_threads = num_threads
+        
+        self.session = ort.InferenceSession(
+            str(model_file),
+            sess_options=so,
+            providers=["CPUExecutionProvider"]
+        )
+        self.tokenizer = AutoTokenizer.from_pretrained(str(self.onnx_dir))
+        self.input_names = {i.name for i in self.session.get_inputs()}
+    
+    def _export(self, model_name: str):
+        """Export the transformer to ONNX and save it with its tokenizer"""
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        
+        # SentenceTransformer resolves bare names under sentence-transformers/
+        hub_name = model_name if '/' in model_name else f"sentence-transformers/{model_name}"
+        
+        logger.info(f"   Exporting {hub_name} to ONNX: {self.onnx_dir}")
+        model = ORTModelForFeatureExtraction.from_pretrained(hub_name, export=True)
+        model.save_pretrained(self.onnx_dir)
+        AutoTokenizer.from_pretrained(hub_name).save_pretrained(self.onnx_dir)
+    
+    def _quantize(self, model_file: Path) -> Path:
+        """Create (once) and return the INT8 dynamically quantized model"""
+        int8_file = model_file.with_name("model_int8.onnx")
+        
+        if not int8_file.exists():
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            
+            logger.info(f"   Quantizing ONNX model to INT8: {int8_file}")
+            quantize_dynamic(
+                str(model_file),
+                str(int8_file),
+                op_types_to_quantize=["MatMul", "Gemm"],
+                weight_type=QuantType.QInt8
+            )
+        
+        return int8_file
+    
+    def encode(
+        self,
+        sentences: Union[str, List[str]],
+        batch_size: int = 32,
+        show_progress_bar: bool = False,
+        convert_to_numpy: bool = True,
+        normalize_embeddings: bool = False
+    ) -> np.ndarray:
+        """
+        Encode text(s) into embeddings (SentenceTransformer.encode subset)
+        
+        Returns:
+            1-D array for a single string, 2-D array for a list
+        """
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        
+        # Tokenize everything once (unpadded); the token counts give the
+        # length order, and each batch is padded only to its own longest
+        encoded = self.tokenizer(
+            texts,
+            padding=False,
+            truncation=True,
+            max_length=self.max_seq_length
+        )
+        features = [
+            {name: encoded[name][i] for name in encoded.keys()}
+            for i in range(len(texts))
+        ]
+        
+        # Encode in token-length order (as SentenceTransformer does), then
+        # restore the input order
+        order = np.argsort([-len(ids) for ids in encoded["input_ids"]], kind="stable")
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            batch_idx = order[start:start + batch_size]
+            batches.append(self._encode_batch([features[i] for i in batch_idx]))
+        
+        sorted_embeddings = np.concatenate(batches)
+        embeddings = np.empty_like(sorted_embeddings)
+        embeddings[order] = sorted_embeddings
+        
+        if normalize_embeddings:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings /= np.clip(norms, 1e-12, None)
+        return embeddings[0] if single else embeddings
+    
+    def _encode_batch(self, features: List[Dict]) -> np.ndarray:
+        encoded = self.tokenizer.pad(features, padding=True, return_tensors="np")
+        inputs = {name: encoded[name].astype(np.int64) for name in self.input_names if name in encoded}
+        token_embeddings = self.session.run(None, inputs)[0]
+        
+        # Mean pooling over real (non-padding) tokens
+        mask = encoded["attention_mask"][..., None].astype(np.float32)
+        summed = (token_embeddings * mask).sum(axis=1)
+        counts = np.clip(mask.sum(axis=1), 1e-9, None)
+        return summed / counts
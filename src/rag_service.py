@@ -3,15 +3,69 @@ RAG (Retrieval-Augmented Generation) Service
 Orchestrates the complete Q&A pipeline
 """
 
-from typing import Dict, List, Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Hashable, Iterator, List, Optional, Tuple, Union
+import asyncio
+import re
+import threading
 import time
 from loguru import logger
 
 from src.embedding_service import get_embedding_service
-from src.llm_service import get_llm_service
+from src.llm_service import LLMStreamError, get_llm_service
 from src.config import config
 
 
+# Language detection keywords
+# Common Indonesian words
+_ID_KEYWORDS = frozenset({'apa', 'yang', 'adalah', 'ini', 'itu', 'dengan', 'dari', 'ke', 'di', 'untuk'})
+# Common English words
+_EN_KEYWORDS = frozenset({'what', 'is', 'the', 'this', 'that', 'with', 'from', 'to', 'in', 'for'})
+_WORD_RE = re.compile(r'\w+')
+
+# Fixed responses per language
+_NO_INFO_MESSAGES = {
+    'id': "Maaf, saya tidak menemukan informasi yang relevan untuk menjawab pertanyaan Anda di basis pengetahuan saya tentang Reog Ponorogo.",
+    'en': "I'm sorry, I couldn't find relevant information to answer your question in my knowledge base about Reog Ponorogo."
+}
+_ERROR_MESSAGES = {
+    'id': "Maaf, terjadi kesalahan saat memproses pertanyaan Anda. Silakan coba lagi.",
+    'en': "I'm sorry, there was an error processing your question. Please try again."
+}
+
+
+class _TTLCache:
+    """Small thread-safe LRU cache whose entries expire after ttl seconds"""
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Hashable):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+    
+    def set(self, key: Hashable, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
 class RAGService:
     """
     RAG Pipeline Service
@@ -35,6 +89,16 @@ class RAGService:
         self.embedding_service = get_embedding_service()
         self.llm_service = get_llm_service()
         
+        # LLM warmups run on their own single worker, so a slow warmup
+        # never delays retrieval; skipped while a warmup or generation for
+        # the language is within RAG_WARMUP_INTERVAL (see _schedule_warmup)
+        self._warmup_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="llm-warmup")
+        self._last_llm_use: Dict[str, float] = {}
+        self._warmup_lock = threading.Lock()
+        
+        # Answers keyed on (question, language, retrieved doc IDs)
+        self._answer_cache = _TTLCache(config.RAG_CACHE_SIZE, config.RAG_CACHE_TTL)
+        
         # Load knowledge base if not already loaded
         self.embedding_service.load_knowledge_base()
         
@@ -46,7 +110,8 @@ class RAGService:
         language: Optional[str] = None,
         top_k: Optional[int] = None,
         return_sources: bool = True,
-        return_timing: bool = False
+        return_timing: bool = False,
+        stream: bool = False
     ) -> Dict:
         """
         Complete RAG pipeline: Answer question with retrieved context
@@ -57,52 +122,63 @@ class RAGService:
             top_k: Number of documents to retrieve (default: from config)
             return_sources: Include source documents in response
             return_timing: Include timing information
+            stream: Return the answer as a generator of text pieces that
+                    yields while the LLM is still generating
         
         Returns:
             dict with:
-                - answer: Generated answer text
+                - answer: Generated answer text (generator if stream=True
+                          and documents were found)
                 - sources: List of source documents (if return_sources=True)
                 - language: Detected/used language
                 - success: True if successful
                 - timing: Dict with timing info (if return_timing=True)
                 - error: Error message (if failed)
+            
+            With stream=True, success/error and timing 'generation'/'total'
+            are final only once the answer generator is exhausted: a failed
+            generation yields the error message and sets success to False.
         """
         timing = {}
         start_time = time.time()
         
         try:
-            # Validate input
-            if not question or not question.strip():
-                return self._error_response("Empty question", language or 'id')
-            
-            question = question.strip()
-            logger.info(f"🔍 RAG Pipeline: '{question[:60]}...'")
-            
-            # Auto-detect language if not specified
-            if language is None:
-                language = self._detect_language(question)
-                logger.info(f"   Auto-detected language: {language}")
+            question, language = self._prepare_question(question, language, "RAG Pipeline")
+            if not question:
+                return self._error_response("Empty question", language)
             
             # STEP 1: Retrieve relevant documents
-            retrieval_start = time.time()
-            
-            documents = self.embedding_service.search(
-                query=question,
-                top_k=top_k or config.RAG_TOP_K,
-                language_filter=language
-            )
-            
-            timing['retrieval'] = time.time() - retrieval_start
-            
+            documents = self._retrieve(question, language, top_k, timing)
             if not documents:
-                logger.warning("   ⚠️ No relevant documents found")
                 return self._no_info_response(question, language)
             
-            logger.info(f"   ✅ Retrieved {len(documents)} documents")
-            for i, doc in enumerate(documents, 1):
-                logger.debug(f"      {i}. {doc['metadata'].get('title', 'Unknown')} (score: {doc['score']:.3f})")
+            # STEP 2: Generate answer using LLM (same question over the same
+            # documents is answered from the cache)
+            cache_key = self._answer_cache_key(question, language, documents)
+            cached = self._cached_response(
+                cache_key, stream, documents, language, timing, start_time,
+                return_sources, return_timing
+            )
+            if cached is not None:
+                return cached
+            
+            if stream:
+                # Generation happens as the caller consumes the answer;
+                # _cache_stream completes the response once it ends
+                response = self._build_response(
+                    None, documents, language, timing, start_time,
+                    return_sources, return_timing
+                )
+                response['answer'] = self._cache_stream(
+                    response, cache_key, language, timing, start_time,
+                    self.llm_service.generate_answer_stream(
+                        question=question,
+                        context_documents=documents,
+                        language=language
+                    )
+                )
+                return response
             
-            # STEP 2: Generate answer using LLM
             generation_start = time.time()
             
             answer = self.llm_service.generate_answer(
@@ -112,80 +188,317 @@ class RAGService:
             )
             
             timing['generation'] = time.time() - generation_start
+            self._mark_llm_used(language)
             
-            if not answer:
-                logger.error("   ❌ LLM generation failed")
-                return self._error_response("Answer generation failed", language)
-            
-            logger.info(f"   ✅ Generated answer: {len(answer)} chars")
-            logger.debug(f"      Answer: {answer[:100]}...")
+            return self._finish_answer(
+                answer, cache_key, documents, language, timing, start_time,
+                return_sources, return_timing
+            )
             
-            # STEP 3: Format sources
-            sources = []
-            if return_sources:
-                sources = self._format_sources(documents)
+        except Exception as e:
+            return self._pipeline_error(e, language)
+    
+    async def aanswer_question(
+        self,
+        question: str,
+        language: Optional[str] = None,
+        top_k: Optional[int] = None,
+        return_sources: bool = True,
+        return_timing: bool = False
+    ) -> Dict:
+        """
+        Async variant of answer_question for event-loop servers
+        
+        Retrieval runs in a worker thread and generation awaits the async
+        Ollama client, so concurrent questions don't block a thread each.
+        Same arguments and response as answer_question (without stream).
+        """
+        timing = {}
+        start_time = time.time()
+        
+        try:
+            question, language = self._prepare_question(question, language, "RAG Pipeline (async)")
+            if not question:
+                return self._error_response("Empty question", language)
             
-            # Calculate total time
-            timing['total'] = time.time() - start_time
+            # STEP 1: Retrieve relevant documents
+            documents = await asyncio.to_thread(self._retrieve, question, language, top_k, timing)
+            if not documents:
+                return self._no_info_response(question, language)
             
-            logger.info(f"   ⏱️ Total time: {timing['total']:.2f}s")
+            # STEP 2: Generate answer using LLM (or the answer cache)
+            cache_key = self._answer_cache_key(question, language, documents)
+            cached = self._cached_response(
+                cache_key, False, documents, language, timing, start_time,
+                return_sources, return_timing
+            )
+            if cached is not None:
+                return cached
             
-            # Build response
-            response = {
-                'answer': answer,
-                'language': language,
-                'success': True
-            }
+            generation_start = time.time()
             
-            if return_sources:
-                response['sources'] = sources
+            answer = await self.llm_service.agenerate_answer(
+                question=question,
+                context_documents=documents,
+                language=language
+            )
             
-            if return_timing:
-                response['timing'] = timing
+            timing['generation'] = time.time() - generation_start
+            self._mark_llm_used(language)
             
-            return response
+            return self._finish_answer(
+                answer, cache_key, documents, language, timing, start_time,
+                return_sources, return_timing
+            )
             
         except Exception as e:
-            logger.error(f"❌ RAG Pipeline Error: {e}")
-            return {
-                'answer': self._get_error_message(language or 'id'),
-                'sources': [],
-                'language': language or 'id',
-                'error': str(e),
-                'success': False
-            }
+            return self._pipeline_error(e, language)
+    
+    def _prepare_question(self, question: str, language: Optional[str], label: str) -> Tuple[str, str]:
+        """
+        Strip the question and auto-detect the language if not specified
+        
+        Returns:
+            (question, language); question is '' if it was empty
+        """
+        if not question or not question.strip():
+            return '', language or 'id'
+        
+        question = question.strip()
+        logger.info(f"🔍 {label}: '{question[:60]}...'")
+        
+        if language is None:
+            language = self._detect_language(question)
+            logger.info(f"   Auto-detected language: {language}")
+        
+        return question, language
+    
+    def _retrieve(self, question: str, language: str, top_k: Optional[int], timing: Dict) -> List[Dict]:
+        """
+        STEP 1: Retrieve relevant documents, warming up the LLM (model load
+        + system prompt prefill) in the background
+        """
+        retrieval_start = time.time()
+        
+        self._schedule_warmup(language)
+        documents = self.embedding_service.search(
+            query=question,
+            top_k=top_k or config.RAG_TOP_K,
+            language_filter=language
+        )
+        
+        timing['retrieval'] = time.time() - retrieval_start
+        
+        if not documents:
+            logger.warning("   ⚠️ No relevant documents found")
+            return documents
+        
+        logger.info(f"   ✅ Retrieved {len(documents)} documents")
+        for i, doc in enumerate(documents, 1):
+            logger.debug(f"      {i}. {doc['metadata'].get('title', 'Unknown')} (score: {doc['score']:.3f})")
+        
+        return documents
+    
+    def _cached_response(
+        self,
+        cache_key: tuple,
+        stream: bool,
+        documents: List[Dict],
+        language: str,
+        timing: Dict,
+        start_time: float,
+        return_sources: bool,
+        return_timing: bool
+    ) -> Optional[Dict]:
+        """Response for a cached answer, or None on a cache miss"""
+        cached_answer = self._answer_cache.get(cache_key)
+        if cached_answer is None:
+            return None
+        
+        logger.info("   ⚡ Answer served from cache")
+        timing['generation'] = 0.0
+        return self._build_response(
+            iter([cached_answer]) if stream else cached_answer,
+            documents, language, timing, start_time,
+            return_sources, return_timing
+        )
+    
+    def _finish_answer(
+        self,
+        answer: str,
+        cache_key: tuple,
+        documents: List[Dict],
+        language: str,
+        timing: Dict,
+        start_time: float,
+        return_sources: bool,
+        return_timing: bool
+    ) -> Dict:
+        """Cache a generated answer and build the response (error if empty)"""
+        if not answer:
+            logger.error("   ❌ LLM generation failed")
+            return self._error_response("Answer generation failed", language)
+        
+        logger.info(f"   ✅ Generated answer: {len(answer)} chars")
+        logger.debug(f"      Answer: {answer[:100]}...")
+        
+        self._answer_cache.set(cache_key, answer)
+        
+        return self._build_response(
+            answer, documents, language, timing, start_time,
+            return_sources, return_timing
+        )
+    
+    def _pipeline_error(self, error: Exception, language: Optional[str]) -> Dict:
+        """Response for an unexpected pipeline error"""
+        logger.error(f"❌ RAG Pipeline Error: {error}")
+        return {
+            'answer': self._get_error_message(language or 'id'),
+            'sources': [],
+            'language': language or 'id',
+            'error': str(error),
+            'success': False
+        }
+    
+    def _answer_cache_key(self, question: str, language: str, documents: List[Dict]) -> tuple:
+        """Answer cache key: normalized question, language, retrieved doc IDs"""
+        return (
+            ' '.join(question.lower().split()),
+            language,
+            tuple(doc['id'] for doc in documents)
+        )
+    
+    def _cache_stream(
+        self,
+        response: Dict,
+        cache_key: tuple,
+        language: str,
+        timing: Dict,
+        start_time: float,
+        pieces: Iterator[str]
+    ) -> Iterator[str]:
+        """
+        Pass a streamed answer through, caching it once Ollama finished it
+        
+        Fills in timing when the stream ends. A failed generation ends the
+        answer with the error message and marks response as failed, as the
+        blocking path would; partial answers are never cached.
+        """
+        generation_start = time.time()
+        parts = []
+        failed = False
+        try:
+            for piece in pieces:
+                parts.append(piece)
+                yield piece
+        except LLMStreamError:
+            failed = True
+        finally:
+            pieces.close()
+            self._mark_llm_used(language)
+            timing['generation'] = time.time() - generation_start
+            timing['total'] = time.time() - start_time
+        
+        answer = ''.join(parts)
+        if answer and not failed:
+            logger.info(f"   ✅ Generated answer: {len(answer)} chars")
+            self._answer_cache.set(cache_key, answer)
+            return
+        
+        logger.error("   ❌ LLM generation failed")
+        response['success'] = False
+        response['error'] = "Answer generation failed"
+        yield (' ' if answer else '') + self._get_error_message(language)
+    
+    def _schedule_warmup(self, language: str):
+        """
+        Queue an LLM warmup unless the model was warmed or used for this
+        language recently
+        
+        The model is then still loaded (and the system prompt cached), and
+        a warmup would only send a wasted request, which on a single-slot
+        Ollama queues the real generation behind it.
+        """
+        now = time.monotonic()
+        with self._warmup_lock:
+            last = self._last_llm_use.get(language)
+            if last is not None and now - last < config.RAG_WARMUP_INTERVAL:
+                return
+            self._last_llm_use[language] = now
+        
+        self._warmup_pool.submit(self._warm_llm, language)
+    
+    def _mark_llm_used(self, language: str):
+        """Record a generation for language (see _schedule_warmup)"""
+        with self._warmup_lock:
+            self._last_llm_use[language] = time.monotonic()
+    
+    def _warm_llm(self, language: str):
+        """Warm the LLM for the upcoming answer (runs on the warmup worker)"""
+        try:
+            self.llm_service.warmup(language)
+        except Exception as e:
+            logger.debug(f"LLM warmup error: {e}")
+    
+    def _build_response(
+        self,
+        answer: Union[str, Iterator[str]],
+        documents: List[Dict],
+        language: str,
+        timing: Dict,
+        start_time: float,
+        return_sources: bool,
+        return_timing: bool
+    ) -> Dict:
+        """Assemble the success response (STEP 3: format sources)"""
+        sources = []
+        if return_sources:
+            sources = self._format_sources(documents)
+        
+        # Calculate total time
+        timing['total'] = time.time() - start_time
+        
+        logger.info(f"   ⏱️ Total time: {timing['total']:.2f}s")
+        
+        # Build response
+        response = {
+            'answer': answer,
+            'language': language,
+            'success': True
+        }
+        
+        if return_sources:
+            response['sources'] = sources
+        
+        if return_timing:
+            response['timing'] = timing
+        
+        return response
     
     def _detect_language(self, text: str) -> str:
         """
         Simple language detection based on keywords
         (For production, use langdetect library)
         """
-        # Common Indonesian words
-        id_keywords = ['apa', 'yang', 'adalah', 'ini', 'itu', 'dengan', 'dari', 'ke', 'di', 'untuk']
-        # Common English words
-        en_keywords = ['what', 'is', 'the', 'this', 'that', 'with', 'from', 'to', 'in', 'for']
+        # One tokenizing pass, then set intersections against each keyword set
+        words = set(_WORD_RE.findall(text.lower()))
         
-        text_lower = text.lower()
-        
-        id_score = sum(1 for kw in id_keywords if kw in text_lower)
-        en_score = sum(1 for kw in en_keywords if kw in text_lower)
+        id_score = len(words & _ID_KEYWORDS)
+        en_score = len(words & _EN_KEYWORDS)
         
         return 'id' if id_score >= en_score else 'en'
     
     def _format_sources(self, documents: List[Dict]) -> List[Dict]:
         """Format source documents for response"""
-        sources = []
-        
-        for doc in documents:
-            source = {
+        return [
+            {
                 'title': doc['metadata'].get('title', 'Unknown'),
                 'category': doc['metadata'].get('category', 'Unknown'),
                 'score': round(doc['score'], 3),
                 'excerpt': doc['content'][:150] + '...' if len(doc['content']) > 150 else doc['content']
             }
-            sources.append(source)
-        
-        return sources
+            for doc in documents
+        ]
     
     def _error_response(self, error_msg: str, language: str) -> Dict:
         """Generate error response"""
@@ -199,13 +512,8 @@ class RAGService:
     
     def _no_info_response(self, question: str, language: str) -> Dict:
         """Generate 'no information' response"""
-        if language == 'id':
-            answer = "Maaf, saya tidak menemukan informasi yang relevan untuk menjawab pertanyaan Anda di basis pengetahuan saya tentang Reog Ponorogo."
-        else:
-            answer = "I'm sorry, I couldn't find relevant information to answer your question in my knowledge base about Reog Ponorogo."
-        
         return {
-            'answer': answer,
+            'answer': _NO_INFO_MESSAGES['id' if language == 'id' else 'en'],
             'sources': [],
             'language': language,
             'success': False
@@ -213,10 +521,7 @@ class RAGService:
     
     def _get_error_message(self, language: str) -> str:
         """Get error message in specified language"""
-        if language == 'id':
-            return "Maaf, terjadi kesalahan saat memproses pertanyaan Anda. Silakan coba lagi."
-        else:
-            return "I'm sorry, there was an error processing your question. Please try again."
+        return _ERROR_MESSAGES['id' if language == 'id' else 'en']
     
     def get_stats(self) -> Dict:
         """Get RAG system statistics"""
@@ -239,13 +544,49 @@ class RAGService:
 
 # Singleton instance
 _rag_service_instance = None
+_rag_service_lock = threading.Lock()
 
 def get_rag_service() -> RAGService:
-    """Get singleton RAG service instance"""
+    """Get singleton RAG service instance (thread-safe)"""
     global _rag_service_instance
     if _rag_service_instance is None:
-        _rag_service_instance = RAGService()
+        with _rag_service_lock:
+            if _rag_service_instance is None:
+                _rag_service_instance = RAGService()
     return _rag_service_instance
 
-# For backward compatibility
-rag_service = get_rag_service()
\ No newline at end of file
+
+# Set once the background warm-up below has built the services
+_ready = threading.Event()
+
+
+def _init_in_background():
+    try:
+        get_rag_service()
+    except Exception as e:
+        logger.error(f"❌ Background RAG initialization failed: {e}")
+    finally:
+        _ready.set()
+
+
+def wait_ready(timeout: Optional[float] = None) -> bool:
+    """
+    Block until the background initialization has finished
+    
+    Returns:
+        True if the RAG service is ready, False on timeout or failure
+    """
+    return _ready.wait(timeout) and _rag_service_instance is not None
+
+
+# Load models, connect to Ollama and ingest the knowledge base off the
+# import path; get_rag_service() callers simply wait on the lock
+threading.Thread(target=_init_in_background, name="rag-init", daemon=True).start()
+
+
+def __getattr__(name: str):
+    # For backward compatibility: `rag_service` is created on first access
+    # instead of at import time
+    if name == "rag_service":
+        return get_rag_service()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,20 +1,35 @@
 """
-Speech-to-Text Service using OpenAI Whisper
+Speech-to-Text Service using Whisper (faster-whisper / CTranslate2)
 Handles audio transcription with automatic language detection
 """
 
-import whisper
-import torch
+import io
+import math
+import os
+from dataclasses import asdict
+
+import ctranslate2
+from faster_whisper import BatchedInferencePipeline, WhisperModel, decode_audio
 import numpy as np
+import soundfile as sf
+from scipy.signal import resample_poly
 from pathlib import Path
 import tempfile
-from typing import Dict, Optional, Union
+import threading
+from typing import Dict, List, Optional, Union
 from loguru import logger
 
 from src.config import config
 from src.text_normalizer import TextNormalizer  # <-- import normalizer
 
 
+# Whisper's input sample rate
+SAMPLE_RATE = 16000
+
+# RAM-backed tmpfs for transcribe_bytes temp files (Linux); None = default temp dir
+TMP_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+
 class STTService:
     """
     Speech-to-Text service using Whisper model
@@ -22,27 +37,64 @@ class STTService:
     Features:
     - Automatic language detection (ID/EN)
     - GPU acceleration (if available)
+    - INT8 quantized CTranslate2 inference
     - Multiple audio format support
     - Robust error handling
     - Text normalization for cultural/local terms
     """
     
-    def __init__(self, model_size: str = None):
+    COMPUTE_TYPES = ('int8', 'int8_float16', 'int8_float32', 'float16', 'float32')
+    
+    # FP16 compute types and their CPU equivalents
+    CPU_FALLBACKS = {'float16': 'float32', 'int8_float16': 'int8'}
+    
+    def __init__(self, model_size: str = None, compute_type: Optional[str] = None):
+        """
+        Args:
+            model_size: Whisper model size (default from config)
+            compute_type: CTranslate2 compute type, one of COMPUTE_TYPES
+                (default from config)
+        """
         self.model_size = model_size or config.WHISPER_MODEL
         self.device = config.WHISPER_DEVICE
         
+        # FP16 is only available on GPU
+        cuda_available = (self.device == 'cuda' and ctranslate2.get_cuda_device_count() > 0)
+        compute_type = compute_type or config.WHISPER_COMPUTE_TYPE
+        if compute_type not in self.COMPUTE_TYPES:
+            raise ValueError(f"Unsupported compute_type: {compute_type} (expected one of {self.COMPUTE_TYPES})")
+        if compute_type in self.CPU_FALLBACKS and not cuda_available:
+            fallback = self.CPU_FALLBACKS[compute_type]
+            logger.warning(f"⚠️ {compute_type} requires CUDA, falling back to {fallback}")
+            compute_type = fallback
+        self.compute_type = compute_type
+        
         logger.info(f"🎤 Initializing Whisper STT...")
         logger.info(f"   Model: {self.model_size}")
         logger.info(f"   Device: {self.device}")
+        logger.info(f"   Compute type: {self.compute_type}")
+        if self.device == 'cpu':
+            logger.info(f"   CPU threads: {config.WHISPER_CPU_THREADS}")
+        logger.info(f"   Workers: {config.WHISPER_NUM_WORKERS}")
         
-        # Load Whisper model
-        self.model = whisper.load_model(
+        # Load Whisper model (CTranslate2 converts/quantizes at load time).
+        # The converted model is kept under models/ so later runs load it
+        # from disk instead of the Hugging Face cache/network
+        config.WHISPER_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        self.model = WhisperModel(
             self.model_size,
-            device=self.device
+            device=self.device,
+            compute_type=self.compute_type,
+            cpu_threads=config.WHISPER_CPU_THREADS if self.device == 'cpu' else 0,
+            num_workers=config.WHISPER_NUM_WORKERS,
+            download_root=str(config.WHISPER_CACHE_DIR)
         )
         
-        # Check if FP16 available (for GPU)
-        self.fp16 = (self.device == 'cuda' and torch.cuda.is_available())
+        # Batched decoding of the VAD chunks of a file (see transcribe_batch)
+        self.batched = BatchedInferencePipeline(model=self.model)
+        
+        # FP16 activations (GPU only)
+        self.fp16 = self.compute_type in self.CPU_FALLBACKS
         
         # Initialize text normalizer
         self.normalizer = TextNormalizer()
@@ -50,42 +102,74 @@ class STTService:
         logger.info(f"✅ Whisper STT loaded successfully")
         logger.info(f"   FP16: {self.fp16}")
     
+    def load_audio(self, audio_path: Union[str, Path]) -> np.ndarray:
+        """
+        Decode an audio file once into a 16 kHz mono float32 waveform, so
+        repeated transcribe() calls skip file I/O and decoding
+        """
+        return decode_audio(str(audio_path), sampling_rate=SAMPLE_RATE)
+    
     def transcribe(
         self, 
-        audio_path: Union[str, Path],
+        audio_path: Union[str, Path, np.ndarray],
         language: Optional[str] = None,
-        task: str = 'transcribe'
+        task: str = 'transcribe',
+        batch_size: Optional[int] = None,
+        word_timestamps: bool = False,
+        verbose: bool = True
     ) -> Dict:
+        """
+        Transcribe a file path or preloaded waveform
+        
+        With batch_size set, the speech chunks found by VAD are decoded in
+        batches (BatchedInferencePipeline) instead of one window at a time.
+        With word_timestamps, each segment carries aligned 'words'.
+        verbose=False logs the result at DEBUG instead of INFO.
+        """
         try:
-            audio_path = str(audio_path)
+            # Accept preloaded waveforms (see load_audio) as well as file paths
+            if isinstance(audio_path, np.ndarray):
+                audio = audio_path
+                audio_name = "<waveform>"
+            else:
+                audio = os.fspath(audio_path)
+                audio_name = os.path.basename(audio)
             
-            logger.info(f"🎤 Transcribing: {Path(audio_path).name}")
-            if language:
-                logger.info(f"   Language hint: {language}")
+            # Arguments are only formatted if DEBUG is enabled
+            logger.debug("🎤 Transcribing: {} (language hint: {})", audio_name, language)
             
-            result = self.model.transcribe(
-                audio_path,
+            # Silero VAD skips non-speech before decoding
+            model = self.batched if batch_size else self.model
+            batch_kwargs = {'batch_size': batch_size} if batch_size else {}
+            segments_iter, info = model.transcribe(
+                audio,
                 language=language,
                 task=task,
-                fp16=self.fp16,
-                verbose=False,
+                vad_filter=True,
                 temperature=0.0,
                 compression_ratio_threshold=2.4,
-                logprob_threshold=-1.0,
-                no_speech_threshold=0.6
+                log_prob_threshold=-1.0,
+                no_speech_threshold=0.6,
+                word_timestamps=word_timestamps,
+                **batch_kwargs
             )
             
-            text = result['text'].strip()
-            detected_language = result.get('language', 'unknown')
-            segments = result.get('segments', [])
+            # Segments are decoded lazily; materialize them as plain dicts
+            segments = [asdict(segment) for segment in segments_iter]
+            text = "".join(segment['text'] for segment in segments).strip()
+            detected_language = info.language or 'unknown'
             
-            # Apply text normalization
-            normalized_text = self.normalizer.normalize(text)
+            # Apply text normalization (skipped when nothing was recognized)
+            normalized_text = self.normalizer.normalize(text) if text else ''
             
-            logger.info(f"✅ Transcription complete:")
-            logger.info(f"   Language: {detected_language}")
-            logger.info(f"   Length: {len(normalized_text)} chars")
-            logger.info(f"   Text: '{normalized_text[:100]}{'...' if len(normalized_text) > 100 else ''}'")
+            logger.opt(lazy=True).log(
+                "INFO" if verbose else "DEBUG",
+                "✅ Transcription complete: {} | {} | {} chars | '{}'",
+                lambda: audio_name,
+                lambda: detected_language,
+                lambda: len(normalized_text),
+                lambda: normalized_text[:100] + ('...' if len(normalized_text) > 100 else '')
+            )
             
             return {
                 'text': normalized_text,
@@ -104,47 +188,77 @@ class STTService:
                 'success': False
             }
     
+    def transcribe_batch(
+        self,
+        paths: List[Union[str, Path, np.ndarray]],
+        language: Optional[str] = None,
+        batch_size: Optional[int] = None
+    ) -> List[Dict]:
+        """Transcribe several files, each with batched chunk decoding"""
+        batch_size = batch_size or config.WHISPER_BATCH_SIZE
+        results = [
+            self.transcribe(path, language, batch_size=batch_size, verbose=False)
+            for path in paths
+        ]
+        
+        failed = sum(not r['success'] for r in results)
+        logger.info(f"✅ Batch transcription complete: {len(results)} files ({failed} failed)")
+        return results
+    
     def transcribe_bytes(
         self,
         audio_bytes: bytes,
         language: Optional[str] = None
     ) -> Dict:
-        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as tmp:
+        # WAV/FLAC/OGG decode in memory; other formats go through a temp file
+        audio = self._decode_bytes(audio_bytes)
+        if audio is not None:
+            return self.transcribe(audio, language)
+        
+        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False, dir=TMP_DIR) as tmp:
             tmp.write(audio_bytes)
-            tmp_path = tmp.name
+            tmp_path = Path(tmp.name)
         
         try:
             result = self.transcribe(tmp_path, language)
         finally:
-            Path(tmp_path).unlink(missing_ok=True)
+            tmp_path.unlink(missing_ok=True)
         
         return result
     
+    def _decode_bytes(self, audio_bytes: bytes) -> Optional[np.ndarray]:
+        """
+        Decode audio bytes with libsndfile into a 16 kHz mono float32
+        waveform; None if the format is not supported
+        """
+        try:
+            audio, sample_rate = sf.read(io.BytesIO(audio_bytes), dtype='float32', always_2d=False)
+        except RuntimeError:  # sf.LibsndfileError: unknown format
+            return None
+        
+        if audio.ndim > 1:
+            audio = audio.mean(axis=1)
+        if sample_rate != SAMPLE_RATE:
+            g = math.gcd(sample_rate, SAMPLE_RATE)
+            audio = resample_poly(audio, SAMPLE_RATE // g, sample_rate // g).astype(np.float32)
+        return audio
+    
     def transcribe_with_timestamps(
         self,
         audio_path: Union[str, Path],
         language: Optional[str] = None
     ) -> Dict:
-        result = self.transcribe(audio_path, language)
+        result = self.transcribe(audio_path, language, word_timestamps=True)
         
         if not result['success']:
             return result
         
-        words = []
-        for segment in result['segments']:
-            segment_start = segment.get('start', 0)
-            segment_text = segment.get('text', '').strip()
-            
-            segment_words = segment_text.split()
-            duration = segment.get('end', segment_start) - segment_start
-            word_duration = duration / max(len(segment_words), 1)
-            
-            for i, word in enumerate(segment_words):
-                words.append({
-                    'word': word,
-                    'start': segment_start + (i * word_duration),
-                    'end': segment_start + ((i + 1) * word_duration)
-                })
+        # Word times from Whisper's cross-attention alignment
+        words = [
+            {'word': word['word'].strip(), 'start': word['start'], 'end': word['end']}
+            for segment in result['segments']
+            for word in segment['words'] or ()
+        ]
         
         result['words'] = words
         return result
@@ -154,6 +268,7 @@ class STTService:
             'model_size': self.model_size,
             'device': self.device,
             'fp16': self.fp16,
+            'compute_type': self.compute_type,
             'parameters': {
                 'tiny': '39M',
                 'base': '74M',
@@ -165,11 +280,21 @@ class STTService:
 
 
 _stt_service_instance = None
+_stt_service_lock = threading.Lock()
 
 def get_stt_service() -> STTService:
+    """Get singleton STT service instance (thread-safe)"""
     global _stt_service_instance
     if _stt_service_instance is None:
-        _stt_service_instance = STTService()
+        with _stt_service_lock:
+            if _stt_service_instance is None:
+                _stt_service_instance = STTService()
     return _stt_service_instance
 
-stt_service = get_stt_service()
\ No newline at end of file
+
+def __getattr__(name: str):
+    # For backward compatibility: `stt_service` is created on first access
+    # instead of at import time
+    if name == "stt_service":
+        return get_stt_service()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
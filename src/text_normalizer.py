@@ -14,90 +14,180 @@ Features:
 
 import re
 import difflib
-from typing import Dict, List
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from rapidfuzz import fuzz, process
+except ImportError:  # Optional: fall back to difflib (pure Python, slower)
+    fuzz = process = None
+
+_UNWANTED_RE = re.compile(r"[^a-zA-Z0-9\s.,!?]")
+
+# Below this many words, per-word extractOne beats cdist's setup cost
+FUZZY_BATCH_MIN_WORDS = 8
+
+NORMALIZE_CACHE_SIZE = 1024
+
+
+# Dictionary of known misheard or misspelled terms -> correct form
+REPLACEMENTS: Dict[str, str] = {
+    # Core Reog Ponorogo terms
+    "riyadh ponderogo": "Reog Ponorogo",
+    "reog ponderogo": "Reog Ponorogo",
+    "reok ponorogo": "Reog Ponorogo",
+    "reog ponorogo": "Reog Ponorogo",
+    "ponorogo reg": "Reog Ponorogo",
+    "reog": "Reog",
+    "ponorogo": "Ponorogo",
+
+    # Characters and figures
+    "klono sewandono": "Raja Klono Sewandono",
+    "bantarangin": "Kerajaan Bantarangin",
+    "kediri": "Kerajaan Kediri",
+    "ragil kuning": "Dewi Ragil Kuning",
+    "putri sanggalangit": "Putri Sanggalangit",
+    "singabarong": "Raja Singabarong",
+    "bujanganom": "Bujanganom",
+    "warok": "Warok",
+
+    # Props and cultural items
+    "dadak merak": "Dadak Merak",
+    "ganongan": "Ganongan",
+    "bujang ganong": "Bujang Ganong",
+    "jaran kepang": "Jaran Kepang",
+    "jathilan": "Jathilan",
+    "pecut": "Pecut",
+    "cemeti": "Cemeti",
+    "barongan": "Barongan",
+
+    # Musical instruments
+    "gamelan": "Gamelan",
+    "angklung reog": "Angklung Reog",
+    "terompet reog": "Terompet Reog",
+    "kongkil": "Kongkil",
+    "kendang": "Kendang",
+    "saron": "Saron",
+    "gong": "Gong",
+    "kempul": "Kempul",
+
+    # Institutions and recognition
+    "unesco": "UNESCO",
+    "creative cities network": "Creative Cities Network",
+    "museum reog ponorogo": "Museum Reog Ponorogo",
+}
+
+# Important cultural terms to preserve capitalization
+IMPORTANT_TERMS: Tuple[str, ...] = (
+    "Reog Ponorogo",
+    "Ponorogo",
+    "Raja Klono Sewandono",
+    "Kerajaan Bantarangin",
+    "Kerajaan Kediri",
+    "Dewi Ragil Kuning",
+    "Putri Sanggalangit",
+    "Raja Singabarong",
+    "Bujanganom",
+    "Warok",
+    "Dadak Merak",
+    "Ganongan",
+    "Bujang Ganong",
+    "Jaran Kepang",
+    "Jathilan",
+    "Pecut",
+    "Cemeti",
+    "Barongan",
+    "Gamelan",
+    "Angklung Reog",
+    "Terompet Reog",
+    "Kongkil",
+    "Kendang",
+    "Saron",
+    "Gong",
+    "Kempul",
+    "UNESCO",
+    "Creative Cities Network",
+    "Museum Reog Ponorogo",
+)
+
+
+def _build_tables(replacements: Dict[str, str], important_terms: Sequence[str]) -> Tuple:
+    """
+    Lookup tables for TextNormalizer:
+    (correct_map, fuzzy_choices, token_re, repl_re, term_re)
+    """
+    # Exact lookups: important terms in their canonical case, then the
+    # dictionary on top (it wins on shared keys)
+    correct_map = {term.lower(): term for term in important_terms}
+    correct_map.update(replacements)
+    
+    # Fuzzy candidates stay cased: the lowercased word is compared against
+    # the cased term, so the capital letter costs similarity and only close
+    # typos reach the cutoff (e.g. "jathil" is not turned into "Jathilan")
+    fuzzy_choices = list(important_terms)
+    
+    # One tokenizer: known phrases (longest first, so multi-word entries
+    # win over their parts), then plain words, then punctuation
+    phrases = sorted(correct_map, key=len, reverse=True)
+    token_re = re.compile(
+        r"\b(?:" + "|".join(re.escape(p) for p in phrases) + r")\b|[a-z0-9]+|[.,!?]+"
+    )
+    
+    # Single-step passes (apply_dictionary / capitalize_terms): one
+    # alternation each, longest first
+    repl_re = re.compile(
+        r"\b(" + "|".join(re.escape(k) for k in sorted(replacements, key=len, reverse=True)) + r")\b",
+        re.IGNORECASE
+    )
+    term_re = re.compile(
+        "|".join(re.escape(t) for t in sorted(important_terms, key=len, reverse=True)),
+        re.IGNORECASE
+    )
+    return correct_map, fuzzy_choices, token_re, repl_re, term_re
+
+
+# Built once at import and shared by every TextNormalizer with the default tables
+_DEFAULT_TABLES = _build_tables(REPLACEMENTS, IMPORTANT_TERMS)
 
 
 class TextNormalizer:
+    __slots__ = (
+        'replacements',
+        'important_terms',
+        '_correct_map',
+        '_fuzzy_choices',
+        '_token_re',
+        '_repl_re',
+        '_term_re',
+        '_term_case',
+        '_normalize_cached',
+    )
+    
     def __init__(self):
-        # Dictionary of known misheard or misspelled terms -> correct form
-        self.replacements: Dict[str, str] = {
-            # Core Reog Ponorogo terms
-            "riyadh ponderogo": "Reog Ponorogo",
-            "reog ponderogo": "Reog Ponorogo",
-            "reok ponorogo": "Reog Ponorogo",
-            "reog ponorogo": "Reog Ponorogo",
-            "ponorogo reg": "Reog Ponorogo",
-            "reog": "Reog",
-            "ponorogo": "Ponorogo",
-
-            # Characters and figures
-            "klono sewandono": "Raja Klono Sewandono",
-            "bantarangin": "Kerajaan Bantarangin",
-            "kediri": "Kerajaan Kediri",
-            "ragil kuning": "Dewi Ragil Kuning",
-            "putri sanggalangit": "Putri Sanggalangit",
-            "singabarong": "Raja Singabarong",
-            "bujanganom": "Bujanganom",
-            "warok": "Warok",
-
-            # Props and cultural items
-            "dadak merak": "Dadak Merak",
-            "ganongan": "Ganongan",
-            "bujang ganong": "Bujang Ganong",
-            "jaran kepang": "Jaran Kepang",
-            "jathilan": "Jathilan",
-            "pecut": "Pecut",
-            "cemeti": "Cemeti",
-            "barongan": "Barongan",
-
-            # Musical instruments
-            "gamelan": "Gamelan",
-            "angklung reog": "Angklung Reog",
-            "terompet reog": "Terompet Reog",
-            "kongkil": "Kongkil",
-            "kendang": "Kendang",
-            "saron": "Saron",
-            "gong": "Gong",
-            "kempul": "Kempul",
-
-            # Institutions and recognition
-            "unesco": "UNESCO",
-            "creative cities network": "Creative Cities Network",
-            "museum reog ponorogo": "Museum Reog Ponorogo",
-        }
-
-        # Important cultural terms to preserve capitalization
-        self.important_terms: List[str] = [
-            "Reog Ponorogo",
-            "Ponorogo",
-            "Raja Klono Sewandono",
-            "Kerajaan Bantarangin",
-            "Kerajaan Kediri",
-            "Dewi Ragil Kuning",
-            "Putri Sanggalangit",
-            "Raja Singabarong",
-            "Bujanganom",
-            "Warok",
-            "Dadak Merak",
-            "Ganongan",
-            "Bujang Ganong",
-            "Jaran Kepang",
-            "Jathilan",
-            "Pecut",
-            "Cemeti",
-            "Barongan",
-            "Gamelan",
-            "Angklung Reog",
-            "Terompet Reog",
-            "Kongkil",
-            "Kendang",
-            "Saron",
-            "Gong",
-            "Kempul",
-            "UNESCO",
-            "Creative Cities Network",
-            "Museum Reog Ponorogo",
-        ]
+        # Per-instance copies, so rebuild() after editing them never touches
+        # the module defaults
+        self.replacements: Dict[str, str] = dict(REPLACEMENTS)
+        self.important_terms: List[str] = list(IMPORTANT_TERMS)
+        
+        self._bind_tables(_DEFAULT_TABLES)
+
+    def rebuild(self):
+        """
+        (Re)build the lookup tables from replacements/important_terms
+        
+        Call after changing either table; also drops cached results.
+        """
+        self._bind_tables(_build_tables(self.replacements, self.important_terms))
+
+    def _bind_tables(self, tables: Tuple):
+        (self._correct_map, self._fuzzy_choices,
+         self._token_re, self._repl_re, self._term_re) = tables
+        self._term_case = {term.lower(): term for term in self._fuzzy_choices}
+        
+        # Repeated transcripts (warmup pings, short utterances) skip the pipeline
+        self._normalize_cached = lru_cache(maxsize=NORMALIZE_CACHE_SIZE)(self._normalize)
 
     def normalize_case(self, text: str) -> str:
         """Convert text to lowercase for easier matching"""
@@ -105,14 +195,11 @@ class TextNormalizer:
 
     def remove_unwanted_chars(self, text: str) -> str:
         """Remove non-alphanumeric characters except basic punctuation"""
-        return re.sub(r"[^a-zA-Z0-9\s.,!?]", "", text)
+        return _UNWANTED_RE.sub("", text)
 
     def apply_dictionary(self, text: str) -> str:
         """Replace known misheard/misspelled terms with correct forms"""
-        normalized = text
-        for wrong, correct in self.replacements.items():
-            normalized = normalized.replace(wrong, correct)
-        return normalized
+        return self._repl_re.sub(lambda m: self.replacements[m.group(0).lower()], text)
 
     def fuzzy_replace(self, text: str, cutoff: float = 0.8) -> str:
         """
@@ -120,39 +207,76 @@ class TextNormalizer:
         cutoff = similarity threshold (0.0 - 1.0)
         """
         words = text.split()
-        corrected_words = []
-
-        for word in words:
-            matches = difflib.get_close_matches(word, self.important_terms, n=1, cutoff=cutoff)
-            if matches:
-                corrected_words.append(matches[0])
-            else:
-                corrected_words.append(word)
-
-        return " ".join(corrected_words)
+        matches = self._fuzzy_match_all(words, cutoff)
+        return " ".join(match or word for word, match in zip(words, matches))
 
     def capitalize_terms(self, text: str) -> str:
         """Ensure important cultural terms are capitalized correctly"""
-        normalized = text
-        for term in self.important_terms:
-            normalized = re.sub(term.lower(), term, normalized, flags=re.IGNORECASE)
-        return normalized
+        return self._term_re.sub(lambda m: self._term_case[m.group(0).lower()], text)
+
+    def _fuzzy_match(self, word: str, cutoff: float = 0.8) -> Optional[str]:
+        """Return the important term closest to word (if above cutoff)"""
+        if process is not None:
+            match = process.extractOne(
+                word, self._fuzzy_choices, scorer=fuzz.ratio, score_cutoff=cutoff * 100
+            )
+            return match[0] if match else None
+        
+        matches = difflib.get_close_matches(word, self._fuzzy_choices, n=1, cutoff=cutoff)
+        return matches[0] if matches else None
+
+    def _fuzzy_match_all(self, words: List[str], cutoff: float = 0.8) -> List[Optional[str]]:
+        """_fuzzy_match over a list of words (one rapidfuzz cdist call for long lists)"""
+        if process is None or len(words) <= FUZZY_BATCH_MIN_WORDS:
+            return [self._fuzzy_match(word, cutoff) for word in words]
+        
+        # Scores below the cutoff come back as 0. Single-threaded (default
+        # workers=1): the matrix is tiny, and transcribe() calls may already
+        # run concurrently
+        scores = process.cdist(
+            words, self._fuzzy_choices, scorer=fuzz.ratio, score_cutoff=cutoff * 100
+        )
+        best = scores.argmax(axis=1)
+        hit = scores[np.arange(len(words)), best] > 0
+        return [self._fuzzy_choices[b] if h else None for b, h in zip(best, hit)]
 
     def normalize(self, text: str) -> str:
+        """Normalize text (results cached per instance, see _normalize)"""
+        # No speech (e.g. no_speech_threshold hit): nothing to normalize
+        if not text or text.isspace():
+            return ""
+        return self._normalize_cached(text)
+
+    def _normalize(self, text: str) -> str:
         """
-        Full normalization pipeline:
-        1. Lowercase
-        2. Remove unwanted characters
-        3. Apply dictionary replacements
-        4. Fuzzy replace
-        5. Capitalize important terms
+        Full normalization pipeline in a single pass over the tokens:
+        1. Lowercase and remove unwanted characters
+        2. Dictionary replacement / capitalization of important terms
+        3. Fuzzy replace words similar to important terms
+        
+        Whitespace is collapsed to single spaces; punctuation stays attached
+        to the word it follows.
         """
-        step1 = self.normalize_case(text)
-        step2 = self.remove_unwanted_chars(step1)
-        step3 = self.apply_dictionary(step2)
-        step4 = self.fuzzy_replace(step3)
-        step5 = self.capitalize_terms(step4)
-        return step5.strip()
+        cleaned = _UNWANTED_RE.sub("", text.lower())
+        matches = list(self._token_re.finditer(cleaned))
+        tokens = [match.group(0) for match in matches]
+        corrected = [self._correct_map.get(token) for token in tokens]
+        
+        # Words without an exact entry go through fuzzy matching
+        unknown = [i for i, token in enumerate(tokens) if corrected[i] is None and token[0].isalnum()]
+        for i, term in zip(unknown, self._fuzzy_match_all([tokens[i] for i in unknown])):
+            corrected[i] = term
+        
+        parts = []
+        prev_end = 0
+        for match, token, term in zip(matches, tokens, corrected):
+            # Only whitespace lies between tokens
+            if parts and match.start() > prev_end:
+                parts.append(" ")
+            parts.append(term or token)
+            prev_end = match.end()
+        
+        return "".join(parts)
 
 
 # Example usage
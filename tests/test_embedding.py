@@ -98,6 +98,26 @@ class TestEmbeddingService:
             assert len(stats['categories']) > 0
             assert len(stats['languages']) > 0
 
+    
+    def test_binary_query_empty_filter(self):
+        """Binary search returns no hits (and no fetch) when the filter matches nothing"""
+        class FailingCollection:
+            def get(self, **kwargs):
+                raise AssertionError(f"unexpected collection.get({kwargs})")
+        
+        # Bare instance: only the binary index and collection are needed
+        service = EmbeddingService.__new__(EmbeddingService)
+        service.collection = FailingCollection()
+        service._binary_index = service._build_binary_index(
+            ['doc_1', 'doc_2'],
+            [[0.5] * 384, [-0.5] * 384],
+            [{'language': 'id', 'category': 'sejarah'}, {'language': 'id', 'category': 'tokoh'}]
+        )
+        
+        result = service._binary_query([0.1] * 384, top_k=3, where_filter={'language': 'en'})
+        
+        assert result == {'ids': [[]], 'documents': [[]], 'metadatas': [[]], 'distances': [[]]}
+
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
\ No newline at end of file
@@ -3,6 +3,7 @@ Unit tests for LLM Service
 """
 
 import os
+import random
 import sys
 import pytest
 
@@ -101,5 +102,56 @@ class TestLLMService:
         assert result['success'] == (len(result['response']) > 0)
 
 
+# Answers as the model might emit them: echoed prompt prefixes, leading and
+# trailing whitespace, missing final punctuation
+RAW_ANSWERS = [
+    ("id", "Jawaban: Berdasarkan konteks, reog berasal dari Ponorogo"),
+    ("id", "  Jawab:   warok adalah tokoh sakti.  \n"),
+    ("id", "Berdasarkan konteks, Dadak Merak dibuat dari bulu merak!"),
+    ("en", "Answer: Based on the context, reog is a dance from East Java"),
+    ("en", "\n the barongan mask weighs about 50 kg?"),
+    ("en", "Answer:"),
+    ("en", "   "),
+    ("id", ""),
+]
+
+
+def _split_randomly(text, rng):
+    """Cut text into random pieces, as Ollama streams tokens"""
+    pieces = []
+    while text:
+        n = rng.randint(1, 6)
+        pieces.append(text[:n])
+        text = text[n:]
+    return pieces
+
+
+class TestAnswerStreaming:
+    """generate_answer_stream must match the blocking post-processing"""
+    
+    @pytest.fixture
+    def offline_service(self, monkeypatch):
+        # No __init__: these tests never talk to Ollama
+        service = LLMService.__new__(LLMService)
+        monkeypatch.setattr(service, "build_rag_prompt", lambda *args, **kwargs: "prompt")
+        return service
+    
+    @pytest.mark.parametrize("language,raw", RAW_ANSWERS)
+    def test_stream_matches_postprocess(self, offline_service, monkeypatch, language, raw):
+        rng = random.Random(raw)
+        expected = offline_service._postprocess_answer(raw, language)
+        
+        for _ in range(20):
+            pieces = _split_randomly(raw, rng)
+            monkeypatch.setattr(offline_service, "generate_stream", lambda *args, **kwargs: iter(pieces))
+            streamed = offline_service.generate_answer_stream("question", [], language=language)
+            assert "".join(streamed) == expected
+    
+    def test_postprocess_answer(self, offline_service):
+        assert offline_service._postprocess_answer("Jawaban: reog dari Ponorogo", "id") == "Reog dari Ponorogo."
+        assert offline_service._postprocess_answer("Answer: It is a dance! ", "en") == "It is a dance!"
+        assert offline_service._postprocess_answer("  ", "en") == ""
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
\ No newline at end of file
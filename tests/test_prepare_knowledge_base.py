@@ -0,0 +1,72 @@
+"""
+Unit tests for knowledge base chunking
+"""
+
+import os
+import sys
+import pytest
+
+# scripts to sys.path to import the module
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "scripts")))
+
+from prepare_knowledge_base import KnowledgeBasePreprocessor
+
+
+@pytest.fixture
+def preprocessor(tmp_path):
+    """Preprocessor on an empty data directory"""
+    return KnowledgeBasePreprocessor(str(tmp_path), str(tmp_path / "kb.json"))
+
+
+def _sentences(n):
+    return " ".join(f"Kalimat nomor {i} bercerita tentang sejarah Reog Ponorogo." for i in range(n))
+
+
+class TestChunking:
+    """Test chunk_text / iter_chunks"""
+    
+    def test_short_text_is_one_chunk(self, preprocessor):
+        text = "Reog Ponorogo adalah kesenian dari Jawa Timur."
+        assert preprocessor.chunk_text(text) == [text]
+    
+    def test_chunks_respect_max_size(self, preprocessor):
+        chunks = preprocessor.chunk_text(_sentences(40), max_chunk_size=300, min_chunk_size=0)
+        
+        assert len(chunks) > 1
+        assert all(len(chunk) <= 300 for chunk in chunks)
+    
+    def test_every_sentence_is_kept(self, preprocessor):
+        text = _sentences(40)
+        joined = " ".join(preprocessor.chunk_text(text, max_chunk_size=300))
+        
+        for i in range(40):
+            assert f"Kalimat nomor {i} " in joined
+    
+    def test_chunks_overlap(self, preprocessor):
+        chunks = preprocessor.chunk_text(_sentences(40), max_chunk_size=300, overlap=50)
+        
+        # Each chunk starts with the last overlap // 5 words of the one before
+        for prev, chunk in zip(chunks, chunks[1:]):
+            assert chunk.split()[:10] == prev.split()[-10:]
+    
+    def test_short_final_chunk_is_merged(self, preprocessor):
+        text = _sentences(5) + " Selesai."
+        chunks = preprocessor.chunk_text(text, max_chunk_size=300, min_chunk_size=100)
+        
+        assert chunks[-1].endswith("Selesai.")
+        assert len(chunks[-1]) >= 100
+    
+    def test_long_sentence_is_own_chunk(self, preprocessor):
+        long_sentence = "Warok " * 80 + "sakti."
+        text = "Awal cerita. " + long_sentence + " Akhir cerita yang cukup panjang untuk berdiri sendiri."
+        chunks = preprocessor.chunk_text(text, max_chunk_size=200, min_chunk_size=0)
+        
+        assert long_sentence.strip() in chunks
+    
+    def test_iter_chunks_matches_chunk_text(self, preprocessor):
+        text = _sentences(25)
+        assert list(preprocessor.iter_chunks(text, max_chunk_size=250)) == preprocessor.chunk_text(text, max_chunk_size=250)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -61,6 +61,7 @@ class TestSTTService:
         assert 'model_size' in info
         assert 'device' in info
         assert 'fp16' in info
+        assert 'compute_type' in info
         assert 'parameters' in info
     
     def test_transcribe_audio_file(self, stt_service, sample_audio_id):